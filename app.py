@@ -1,25 +1,33 @@
+import os
 from flask import Flask
 from flask_login import LoginManager
 from werkzeug.security import generate_password_hash
+from config import Config
 from models import db, User, Department, Doctor
+from engine import init_engine
 from routes.admin_routes import admin_bp
 from routes.doctor_routes import doctor_bp
 from routes.patient_routes import patient_bp
 from routes.auth_routes import auth_bp
+from routes.search_routes import search_bp
+from instrumentation import init_instrumentation
+from metrics import init_metrics
+from profiler import init_profiler
+from migrations import upgrade_database
+from commands import register_commands
+from sweeper import start_sweeper
+from user_cache import load_session_user
+from cache_policy import init_cache_policy
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your_secret_key_here'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///hospital.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db.init_app(app)
-
-def no_cache(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-    return response
+app.config.from_object(Config)
+app.logger.setLevel(app.config['LOG_LEVEL'])
 
+init_engine(app, db)
+init_instrumentation(app)
+init_metrics(app)
+init_cache_policy(app)
+init_profiler(app)
 
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
@@ -28,20 +36,21 @@ login_manager.init_app(app)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_session_user(user_id)
 
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(admin_bp)
 app.register_blueprint(doctor_bp)
 app.register_blueprint(patient_bp)
+app.register_blueprint(search_bp)
 
-app.after_request(no_cache)
+register_commands(app)
 
 
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        upgrade_database()
         if not User.query.filter_by(email="admin@hospital.com").first():
             admin_user = User(
                 name="Admin",
@@ -111,4 +120,7 @@ if __name__ == '__main__':
             doctor.department_id = dept.id
         db.session.commit()
 
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_sweeper(app)
+
     app.run(debug=True)
@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, func, literal
+from models import db, Appointment, Treatment, ArchivedAppointment, ArchivedTreatment
+
+ARCHIVED_STATUSES = ('Completed', 'Cancelled')
+
+appointments = Appointment.__table__
+treatments = Treatment.__table__
+
+
+def _batch_end(conn, table, condition, batch_size):
+    """Highest id among the next `batch_size` rows matching `condition`, or None when done."""
+    ids = db.select(table.c.id).where(condition).order_by(table.c.id).limit(batch_size).subquery()
+    return conn.execute(db.select(func.max(ids.c.id))).scalar()
+
+
+def _copy(conn, source, target, condition, archived_at=None):
+    columns = [c.name for c in source.columns]
+    selected = [source.c[name] for name in columns]
+    if archived_at is not None:
+        columns.append('archived_at')
+        selected.append(literal(archived_at, db.DateTime))
+    conn.execute(target.insert().from_select(columns, db.select(*selected).where(condition)))
+
+
+def archive_appointments(cutoff, batch_size):
+    """
+    Move completed and cancelled appointments that started before `cutoff`,
+    with their treatments, into the archive tables. Each batch is one
+    transaction bounded by an id range, so no id lists are built.
+    """
+    archivable = and_(
+        appointments.c.status.in_(ARCHIVED_STATUSES),
+        appointments.c.start_at < cutoff,
+    )
+
+    moved = 0
+    while True:
+        with db.engine.begin() as conn:
+            last_id = _batch_end(conn, appointments, archivable, batch_size)
+            if last_id is None:
+                return moved
+
+            batch = and_(archivable, appointments.c.id <= last_id)
+            batch_ids = db.select(appointments.c.id).where(batch)
+            _copy(conn, appointments, ArchivedAppointment.__table__, batch, datetime.utcnow())
+            _copy(conn, treatments, ArchivedTreatment.__table__, treatments.c.appointment_id.in_(batch_ids))
+            conn.execute(treatments.delete().where(treatments.c.appointment_id.in_(batch_ids)))
+            moved += conn.execute(appointments.delete().where(batch)).rowcount
+
+
+def archive_old_rows(cutoff=None, batch_size=None):
+    """
+    Archive appointments older than `cutoff` (default: ARCHIVE_AFTER_DAYS
+    ago) in batches of ARCHIVE_BATCH_SIZE and return how many moved.
+    Dashboard counters are all-time totals, so they stay as they are.
+    Ended availability slots are not archived: the slot sweeper deletes them.
+    """
+    config = current_app.config
+    cutoff = cutoff or datetime.now() - timedelta(days=config['ARCHIVE_AFTER_DAYS'])
+    batch_size = batch_size or config['ARCHIVE_BATCH_SIZE']
+    return archive_appointments(cutoff, batch_size)
@@ -0,0 +1,385 @@
+import threading
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+from flask import abort, jsonify, request
+from sqlalchemy import and_, case
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Appointment, Availability, Doctor, ScheduleTemplate
+from schedule import is_offered, load_weeks, weekly_schedule
+from timeslots import SLOTS, slot_bounds, slot_end, slot_for_label, window_bounds
+
+from cache_policy import conditional
+
+availability_table = Availability.__table__
+SLOT_KEY = ['doctor_id', 'date', 'time_slot']
+MAX_GRID_DAYS = 31
+CACHE_SIZE = 1024
+
+# (doctor_id, first_day, days) -> (availability_version, frozenset of stored slot labels)
+_window_labels = {}
+_window_labels_lock = threading.Lock()
+
+# A slot that only exists in the doctor's weekly schedule; it has no row until booked or overridden.
+TemplateSlot = namedtuple('TemplateSlot', 'id doctor_id date time_slot status')
+
+
+def _insert():
+    # engine.init_engine only accepts SQLite and PostgreSQL.
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return postgresql.insert(availability_table)
+    return sqlite.insert(availability_table)
+
+
+def _slot_row(doctor_id, date_str, slot_label, status):
+    start_at, end_at = slot_bounds(date_str, slot_label)
+    return {
+        'doctor_id': doctor_id,
+        'date': date_str,
+        'time_slot': slot_label,
+        'status': status,
+        'start_at': start_at,
+        'end_at': end_at,
+    }
+
+
+def _slot_match(doctor_id, date_str, slot_label, status):
+    c = availability_table.c
+    return (c.doctor_id == doctor_id, c.date == date_str, c.time_slot == slot_label, c.status == status)
+
+
+def apply_slot_changes(doctor_id, changes):
+    """
+    Apply a batch of {(date, slot_label): status} edits from the weekly
+    editor, where status 'none' removes the slot. Slots from the weekly
+    schedule are open by default, so for them only 'Unavailable' is
+    stored and anything else drops the override. Existing rows for the
+    affected dates are read in one query, then deletes and upserts go out
+    as one statement each. Booked slots are never touched. Returns the
+    number of slots that actually changed; the caller commits.
+    """
+    if not changes:
+        return 0
+
+    week = weekly_schedule(doctor_id)
+    dates = {date_str for date_str, _ in changes}
+    existing = {
+        (row.date, row.time_slot): row
+        for row in db.session.execute(
+            db.select(Availability.id, Availability.date, Availability.time_slot, Availability.status)
+            .where(Availability.doctor_id == doctor_id, Availability.date.in_(dates))
+        )
+    }
+
+    to_delete = []
+    to_upsert = []
+    for (date_str, slot_label), status in changes.items():
+        current = existing.get((date_str, slot_label))
+        if current and current.status == 'Booked':
+            continue
+        if is_offered(week, date_str, slot_label):
+            status = 'Unavailable' if status == 'Unavailable' else 'none'
+        if status == 'none':
+            if current:
+                to_delete.append(current.id)
+        elif not current or current.status != status:
+            to_upsert.append(_slot_row(doctor_id, date_str, slot_label, status))
+
+    if to_delete:
+        db.session.execute(availability_table.delete().where(availability_table.c.id.in_(to_delete)))
+
+    if to_upsert:
+        stmt = _insert()
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=SLOT_KEY,
+                set_={'status': stmt.excluded.status},
+                where=availability_table.c.status != 'Booked'
+            ),
+            to_upsert
+        )
+
+    changed = len(to_delete) + len(to_upsert)
+    if changed:
+        bump_availability_version(doctor_id)
+    return changed
+
+
+def toggle_slot(doctor_id, date_str, slot_label):
+    """
+    Flip a slot between Available and Unavailable, creating it as Available
+    if it does not exist yet, in a single upsert. A slot from the weekly
+    schedule starts out Available, so its first flip stores an Unavailable
+    override and the next one deletes it again. Returns False when the
+    slot is booked and was left alone; the caller commits.
+    """
+    initial = 'Available'
+    if is_offered(weekly_schedule(doctor_id), date_str, slot_label):
+        reopened = db.session.execute(
+            availability_table.delete().where(*_slot_match(doctor_id, date_str, slot_label, 'Unavailable'))
+        ).rowcount
+        if reopened:
+            bump_availability_version(doctor_id)
+            return True
+        initial = 'Unavailable'
+
+    stmt = _insert()
+    result = db.session.execute(
+        stmt.values(**_slot_row(doctor_id, date_str, slot_label, initial))
+        .on_conflict_do_update(
+            index_elements=SLOT_KEY,
+            set_={'status': case(
+                (availability_table.c.status == 'Available', 'Unavailable'),
+                else_='Available'
+            )},
+            where=availability_table.c.status != 'Booked'
+        )
+    )
+    if result.rowcount != 1:
+        return False
+    bump_availability_version(doctor_id)
+    return True
+
+
+def claim_template_slot(doctor_id, date_str, slot_label, now=None):
+    """
+    Claim a slot from the doctor's weekly schedule by inserting its row as
+    Booked. Racing patients collide on the slot's unique key and only one
+    insert lands; a stored Available override is claimed by the same
+    upsert. Returns True when this caller got the slot; the caller bumps
+    the version and commits.
+    """
+    if not is_offered(weekly_schedule(doctor_id), date_str, slot_label):
+        return False
+    row = _slot_row(doctor_id, date_str, slot_label, 'Booked')
+    if row['end_at'] is None or row['end_at'] <= (now or datetime.now()):
+        return False
+
+    stmt = _insert()
+    result = db.session.execute(
+        stmt.values(**row).on_conflict_do_update(
+            index_elements=SLOT_KEY,
+            set_={'status': 'Booked'},
+            where=availability_table.c.status == 'Available'
+        )
+    )
+    return result.rowcount == 1
+
+
+def release_slot(doctor_id, date_str, slot_label):
+    """
+    Reopen the slot of a cancelled appointment. A weekly schedule slot
+    needs no row once it is free again, so it is deleted; any other slot
+    goes back to Available. The caller commits.
+    """
+    match = _slot_match(doctor_id, date_str, slot_label, 'Booked')
+    if is_offered(weekly_schedule(doctor_id), date_str, slot_label):
+        stmt = availability_table.delete().where(*match)
+    else:
+        stmt = availability_table.update().where(*match).values(status='Available')
+    if db.session.execute(stmt).rowcount:
+        bump_availability_version(doctor_id)
+
+
+def release_patient_slots(patient_id):
+    """
+    Reopen the slots held by a patient's Booked appointments before they
+    are deleted, like release_slot does for one cancellation: weekly
+    schedule slots lose their row, any other slot goes back to Available.
+    The held rows are found in one joined query and released with one
+    DELETE and one UPDATE. The caller commits.
+    """
+    appointments = Appointment.__table__
+    c = availability_table.c
+    held = db.session.execute(
+        db.select(c.id, c.doctor_id, c.date, c.time_slot)
+        .join(appointments, and_(
+            appointments.c.doctor_id == c.doctor_id,
+            appointments.c.date == c.date,
+            appointments.c.time == c.time_slot
+        ))
+        .where(appointments.c.patient_id == patient_id,
+               appointments.c.status == 'Booked',
+               c.status == 'Booked')
+    ).all()
+    if not held:
+        return
+
+    doctor_ids = sorted({row.doctor_id for row in held})
+    weeks = load_weeks(doctor_ids)
+    scheduled, stored = [], []
+    for row in held:
+        offered = is_offered(weeks[row.doctor_id], row.date, row.time_slot)
+        (scheduled if offered else stored).append(row.id)
+    if scheduled:
+        db.session.execute(availability_table.delete().where(c.id.in_(scheduled)))
+    if stored:
+        db.session.execute(availability_table.update().where(c.id.in_(stored)).values(status='Available'))
+    bump_availability_version(doctor_ids)
+
+
+def bump_availability_version(doctor_ids, connection=None):
+    """Mark the slot grid of these doctors as changed for ETag purposes."""
+    doctors = Doctor.__table__
+    stmt = doctors.update().values(availability_version=doctors.c.availability_version + 1)
+    if isinstance(doctor_ids, int):
+        stmt = stmt.where(doctors.c.id == doctor_ids)
+    else:
+        stmt = stmt.where(doctors.c.id.in_(doctor_ids))
+    (connection or db.session).execute(stmt)
+
+
+def availability_version(doctor_id):
+    return db.session.execute(
+        db.select(Doctor.availability_version).where(Doctor.id == doctor_id)
+    ).scalar()
+
+
+@db.event.listens_for(Availability, 'after_insert')
+@db.event.listens_for(Availability, 'after_update')
+@db.event.listens_for(Availability, 'after_delete')
+@db.event.listens_for(ScheduleTemplate, 'after_insert')
+@db.event.listens_for(ScheduleTemplate, 'after_update')
+@db.event.listens_for(ScheduleTemplate, 'after_delete')
+def _availability_changed(mapper, connection, target):
+    bump_availability_version(target.doctor_id, connection)
+
+
+def stored_labels(doctor_id, version, first_day, days):
+    """
+    The distinct labels of the doctor's stored slots in a window, cached
+    per process against the availability_version that every slot write
+    bumps.
+    """
+    key = (doctor_id, first_day, days)
+    with _window_labels_lock:
+        cached = _window_labels.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    window_start, window_end = window_bounds(first_day, days)
+    labels = frozenset(db.session.execute(
+        db.select(Availability.time_slot).distinct().where(
+            Availability.doctor_id == doctor_id,
+            Availability.start_at >= window_start,
+            Availability.start_at < window_end
+        )
+    ).scalars())
+    with _window_labels_lock:
+        if len(_window_labels) >= CACHE_SIZE:
+            _window_labels.clear()
+        _window_labels[key] = (version, labels)
+    return labels
+
+
+def grid_slots(week, dates, labels):
+    """
+    The grid rows in start-time order: the stored `labels`, the weekly
+    schedule's labels on `dates`, and the standard SLOTS for doctors
+    without a schedule.
+    """
+    labels = set(labels)
+    for d in dates:
+        labels.update(week.get(d.weekday(), ()))
+    if not week:
+        labels.update(slot['label'] for slot in SLOTS)
+    return sorted(
+        filter(None, map(slot_for_label, labels)),
+        key=lambda slot: (slot['start_hour'], slot['start_min'], slot['end_hour'], slot['end_min'])
+    )
+
+
+def build_grid(doctor_id, first_day, days=7, now=None, version=None):
+    """
+    Load one doctor's slots for `days` days starting at `first_day`.
+    Slots of the weekly schedule are expanded here and stored rows (bookings
+    and overrides) are laid over them. Returns (dates, slots, avail_map,
+    disabled_map): slots are the grid rows in start-time order, avail_map is
+    {iso_date: {slot_label: Availability or TemplateSlot}} and disabled_map
+    marks the slots that have already ended.
+    """
+    now = now or datetime.now()
+    dates = [first_day + timedelta(days=i) for i in range(days)]
+    week = weekly_schedule(doctor_id, version)
+
+    window_start, window_end = window_bounds(first_day, days)
+    availabilities = Availability.query.filter(
+        Availability.doctor_id == doctor_id,
+        Availability.start_at >= window_start,
+        Availability.start_at < window_end
+    ).all()
+
+    avail_map = {}
+    for d in dates:
+        key = d.isoformat()
+        for label in week.get(d.weekday(), ()):
+            avail_map.setdefault(key, {})[label] = TemplateSlot(None, doctor_id, key, label, 'Available')
+    for a in availabilities:
+        avail_map.setdefault(a.start_at.date().isoformat(), {})[a.time_slot] = a
+
+    slots = grid_slots(week, dates, {a.time_slot for a in availabilities})
+
+    disabled_map = {
+        d.isoformat(): {slot['label']: slot_end(d, slot) <= now for slot in slots}
+        for d in dates
+    }
+    return dates, slots, avail_map, disabled_map
+
+
+def grid_etag(doctor_id, version, first_day, days, now=None):
+    """
+    Strong validator for a grid window: it changes when the doctor's slots
+    or schedule are written and when another cell of the grid ends. The
+    cells are counted over the same rows build_grid lays out, stored
+    labels included.
+    """
+    now = now or datetime.now()
+    dates = [first_day + timedelta(days=i) for i in range(days)]
+    week = weekly_schedule(doctor_id, version)
+    slots = grid_slots(week, dates, stored_labels(doctor_id, version, first_day, days))
+    ended = sum(1 for d in dates for slot in slots if slot_end(d, slot) <= now)
+    return f"{doctor_id}-{version}-{first_day.isoformat()}-{days}-{ended}"
+
+
+def grid_payload(doctor_id, version, dates, slots, avail_map, disabled_map):
+    days = []
+    for d in dates:
+        key = d.isoformat()
+        cells = []
+        for slot in slots:
+            a = avail_map.get(key, {}).get(slot['label'])
+            cells.append({
+                'label': slot['label'],
+                'id': a.id if a else None,
+                'status': a.status if a else None,
+                'expired': disabled_map[key][slot['label']],
+            })
+        days.append({'date': key, 'slots': cells})
+    return {'doctor_id': doctor_id, 'version': version, 'days': days}
+
+
+def grid_json_response(doctor_id):
+    """
+    JSON view of a doctor's slot grid for ?start=YYYY-MM-DD&days=N
+    (default: today, 7 days). The ETag is checked against the doctor's
+    availability version before the slots are loaded, so a polling client
+    with an unchanged grid costs one primary-key lookup (plus loading the
+    weekly schedule and the window's stored labels once per process and
+    version) and gets a 304.
+    """
+    now = datetime.now()
+    try:
+        first_day = date.fromisoformat(request.args.get('start', ''))
+    except ValueError:
+        first_day = now.date()
+    days = min(max(request.args.get('days', 7, type=int), 1), MAX_GRID_DAYS)
+
+    version = availability_version(doctor_id)
+    if version is None:
+        abort(404)
+
+    not_modified = conditional(grid_etag(doctor_id, version, first_day, days, now))
+    if not_modified:
+        return not_modified
+
+    dates, slots, avail_map, disabled_map = build_grid(doctor_id, first_day, days, now, version)
+    return jsonify(grid_payload(doctor_id, version, dates, slots, avail_map, disabled_map))
@@ -0,0 +1,116 @@
+"""
+Fire concurrent bookings at a single slot and check that exactly one wins.
+
+    python -m bench.booking_stress --attempts 300 --threads 32
+
+Runs against a throwaway SQLite database (or --database-uri) and prints a
+JSON summary with throughput. Exits non-zero if the slot was booked more
+than once or not at all.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from flask import Flask
+
+from config import Config
+from engine import init_engine
+from models import db, User, Doctor, Patient, Availability, Appointment
+from migrations import upgrade_database
+from booking import book_slot
+
+
+def build_app(database_uri):
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = 30000
+    init_engine(app, db)
+    return app
+
+
+def seed(app, patients):
+    with app.app_context():
+        upgrade_database()
+        doctor_user = User(name='Stress Doctor', email='stress-doctor@example.com', password='-', role='doctor')
+        db.session.add(doctor_user)
+        db.session.flush()
+        doctor = Doctor(user_id=doctor_user.id, specialization='General Medicine')
+        db.session.add(doctor)
+
+        users = [
+            User(name=f'Stress Patient {i}', email=f'stress-patient-{i}@example.com', password='-', role='patient')
+            for i in range(patients)
+        ]
+        db.session.add_all(users)
+        db.session.flush()
+        patient_rows = [Patient(user_id=u.id) for u in users]
+        db.session.add_all(patient_rows)
+
+        slot = Availability(
+            doctor_id=doctor.id,
+            date=(date.today() + timedelta(days=1)).isoformat(),
+            time_slot='08:00 - 12:00',
+            status='Available'
+        )
+        db.session.add(slot)
+        db.session.commit()
+        return doctor.id, slot.id, [p.id for p in patient_rows]
+
+
+def run(attempts, threads, database_uri=None):
+    tmp = None
+    if database_uri is None:
+        tmp = tempfile.mkdtemp()
+        database_uri = 'sqlite:///' + os.path.join(tmp, 'stress.db')
+
+    app = build_app(database_uri)
+    doctor_id, slot_id, patient_ids = seed(app, attempts)
+
+    def attempt(patient_id):
+        with app.app_context():
+            try:
+                return 'booked' if book_slot(patient_id, doctor_id, slot_id) else 'rejected'
+            except Exception:
+                db.session.rollback()
+                return 'error'
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(attempt, patient_ids))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        booked_rows = Appointment.query.filter_by(doctor_id=doctor_id, status='Booked').count()
+
+    return {
+        'attempts': attempts,
+        'threads': threads,
+        'booked': outcomes.count('booked'),
+        'rejected': outcomes.count('rejected'),
+        'errors': outcomes.count('error'),
+        'appointments_in_db': booked_rows,
+        'elapsed_s': round(elapsed, 4),
+        'attempts_per_s': round(attempts / elapsed, 1) if elapsed else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=300)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--database-uri')
+    args = parser.parse_args(argv)
+
+    result = run(args.attempts, args.threads, args.database_uri)
+    print(json.dumps(result, indent=2))
+    return 0 if result['booked'] == 1 and result['appointments_in_db'] == 1 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
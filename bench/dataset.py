@@ -0,0 +1,256 @@
+"""
+Build a deterministic synthetic hospital for benchmarks.
+
+    python -m bench.dataset --database-uri sqlite:////tmp/bench.db \\
+        --doctors 1000 --patients 200000 --appointments 2000000
+
+Rows go in with multi-row Core INSERTs in batches, ids assigned up front,
+so the same --seed always gives the same database. Every user's password
+is --password. Prints a JSON manifest that bench.routes reads back.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+
+DEPARTMENTS = [
+    'Cardiology', 'Neurology', 'Orthopedics', 'Pulmonology', 'General Medicine',
+    'Dermatology', 'Pediatrics', 'ENT', 'Gynecology', 'Psychiatry',
+]
+DIAGNOSES = [
+    'hypertension', 'migraine', 'bronchitis', 'asthma', 'eczema', 'fracture',
+    'influenza', 'anemia', 'arrhythmia', 'sinusitis', 'dermatitis', 'anxiety',
+]
+PRESCRIPTIONS = ['paracetamol', 'amoxicillin', 'ibuprofen', 'salbutamol', 'cetirizine', 'metformin']
+ADMIN_EMAIL = 'admin@bench.test'
+
+
+def doctor_email(n):
+    return f'doctor{n}@bench.test'
+
+
+def patient_email(n):
+    return f'patient{n}@bench.test'
+
+
+def load_app(database_uri):
+    """Import the real application bound to `database_uri`."""
+    os.environ['DATABASE_URL'] = database_uri
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import app
+    return app
+
+
+def _insert(conn, table, rows, batch_size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+
+
+def build_dataset(app, doctors, patients, appointments, seed=0, password='bench',
+                  days_ahead=14, history_days=730, batch_size=10000):
+    """
+    Fill an empty database and return the manifest: row counts and the id
+    ranges the route benchmark samples from. Past appointments are
+    completed (with a treatment) or cancelled; every doctor gets both
+    standard slots for the next `days_ahead` days, a fifth of them booked.
+    """
+    from werkzeug.security import generate_password_hash
+    from models import (
+        db, User, Department, Doctor, Patient, Appointment, Treatment, Availability
+    )
+    from migrations import upgrade_database
+    from stats import rebuild_stats
+    from search import create_search_index
+    from timeslots import SLOTS, slot_bounds
+    from sqlalchemy import text
+
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    today = date.today()
+    labels = [slot['label'] for slot in SLOTS]
+    bounds = {}
+
+    def slot_times(day, label):
+        key = (day, label)
+        if key not in bounds:
+            bounds[key] = slot_bounds(day.isoformat(), label)
+        return bounds[key]
+
+    with app.app_context():
+        upgrade_database()
+        if db.session.execute(db.select(User.id).limit(1)).first():
+            raise SystemExit('bench.dataset needs an empty database')
+        db.session.remove()
+
+        password_hash = generate_password_hash(password)
+        with db.engine.begin() as conn:
+            sqlite = conn.dialect.name == 'sqlite'
+            if sqlite:
+                # Index treatments once at the end instead of row by row.
+                for suffix in ('ai', 'ad', 'au'):
+                    conn.execute(text(f'DROP TRIGGER IF EXISTS treatments_fts_{suffix}'))
+
+            conn.execute(Department.__table__.insert(), [
+                {'id': i + 1, 'name': name, 'description': ''} for i, name in enumerate(DEPARTMENTS)
+            ])
+
+            def users():
+                yield {'id': 1, 'name': 'Bench Admin', 'email': ADMIN_EMAIL,
+                       'password': password_hash, 'role': 'admin', 'active': True}
+                for n in range(1, doctors + 1):
+                    yield {'id': 1 + n, 'name': f'Doctor {n}', 'email': doctor_email(n),
+                           'password': password_hash, 'role': 'doctor', 'active': True}
+                for n in range(1, patients + 1):
+                    yield {'id': 1 + doctors + n, 'name': f'Patient {n}', 'email': patient_email(n),
+                           'password': password_hash, 'role': 'patient', 'active': True}
+            _insert(conn, User.__table__, users(), batch_size)
+
+            doctor_departments = [rng.randrange(len(DEPARTMENTS)) for _ in range(doctors)]
+            _insert(conn, Doctor.__table__, (
+                {
+                    'id': n, 'user_id': 1 + n,
+                    'specialization': DEPARTMENTS[doctor_departments[n - 1]],
+                    'department_id': doctor_departments[n - 1] + 1,
+                    'experience': rng.randint(1, 35),
+                }
+                for n in range(1, doctors + 1)
+            ), batch_size)
+            _insert(conn, Patient.__table__, (
+                {
+                    'id': n, 'user_id': 1 + doctors + n,
+                    'age': rng.randint(1, 95), 'gender': rng.choice(('Male', 'Female')),
+                }
+                for n in range(1, patients + 1)
+            ), batch_size)
+
+            slots = []
+            booked = []
+            for doctor_id in range(1, doctors + 1):
+                for offset in range(1, days_ahead + 1):
+                    day = today + timedelta(days=offset)
+                    for label in labels:
+                        status = 'Booked' if rng.random() < 0.2 else 'Available'
+                        start_at, end_at = slot_times(day, label)
+                        slots.append({
+                            'id': len(slots) + 1, 'doctor_id': doctor_id, 'date': day.isoformat(),
+                            'time_slot': label, 'status': status, 'start_at': start_at, 'end_at': end_at,
+                        })
+                        if status == 'Booked':
+                            booked.append(slots[-1])
+            for slot in booked[appointments:]:
+                slot['status'] = 'Available'
+            booked = booked[:appointments]
+            _insert(conn, Availability.__table__, slots, batch_size)
+
+            past = appointments - len(booked)
+            treatments = 0
+
+            def appointment_rows():
+                for n in range(1, past + 1):
+                    day = today - timedelta(days=rng.randint(1, history_days))
+                    label = rng.choice(labels)
+                    start_at, end_at = slot_times(day, label)
+                    yield {
+                        'id': n, 'doctor_id': rng.randint(1, doctors), 'patient_id': rng.randint(1, patients),
+                        'date': day.isoformat(), 'time': label, 'start_at': start_at, 'end_at': end_at,
+                        'status': 'Cancelled' if rng.random() < 0.15 else 'Completed',
+                    }
+                for n, slot in enumerate(booked, past + 1):
+                    yield {
+                        'id': n, 'doctor_id': slot['doctor_id'], 'patient_id': rng.randint(1, patients),
+                        'date': slot['date'], 'time': slot['time_slot'], 'status': 'Booked',
+                        'start_at': slot['start_at'], 'end_at': slot['end_at'],
+                    }
+
+            # Treatments are generated alongside so each completed visit gets one.
+            appointment_batch, treatment_batch = [], []
+            for row in appointment_rows():
+                appointment_batch.append(row)
+                if row['status'] == 'Completed':
+                    treatments += 1
+                    treatment_batch.append({
+                        'id': treatments, 'appointment_id': row['id'], 'visit_type': 'OPD',
+                        'diagnosis': rng.choice(DIAGNOSES), 'prescription': rng.choice(PRESCRIPTIONS),
+                        'tests_done': '', 'notes': f'Medicines: {rng.choice(PRESCRIPTIONS)}',
+                        'followup_required': 'No',
+                    })
+                if len(appointment_batch) >= batch_size:
+                    conn.execute(Appointment.__table__.insert(), appointment_batch)
+                    if treatment_batch:
+                        conn.execute(Treatment.__table__.insert(), treatment_batch)
+                    appointment_batch, treatment_batch = [], []
+            if appointment_batch:
+                conn.execute(Appointment.__table__.insert(), appointment_batch)
+            if treatment_batch:
+                conn.execute(Treatment.__table__.insert(), treatment_batch)
+
+            if sqlite:
+                create_search_index(conn)
+            elif conn.dialect.name == 'postgresql':
+                for table in (User, Department, Doctor, Patient, Appointment, Treatment, Availability):
+                    name = table.__tablename__
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                        f"(SELECT coalesce(max(id), 1) FROM {name}))"
+                    ))
+            rebuild_stats(conn)
+
+        return {
+            'database_uri': app.config['SQLALCHEMY_DATABASE_URI'],
+            'seed': seed,
+            'password': password,
+            'admin_email': ADMIN_EMAIL,
+            'departments': len(DEPARTMENTS),
+            'doctors': doctors,
+            'patients': patients,
+            'appointments': appointments,
+            'treatments': treatments,
+            'availabilities': len(slots),
+            'days_ahead': days_ahead,
+            'slot_labels': labels,
+            'slots_per_doctor': days_ahead * len(labels),
+            'first_slot_id': 1,
+            'last_slot_id': len(slots),
+            'search_terms': DIAGNOSES,
+            'build_s': round(time.perf_counter() - started, 2),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-uri', required=True)
+    parser.add_argument('--doctors', type=int, default=1000)
+    parser.add_argument('--patients', type=int, default=200000)
+    parser.add_argument('--appointments', type=int, default=2000000)
+    parser.add_argument('--days-ahead', type=int, default=14)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--password', default='bench')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--manifest', help='Also write the manifest to this file.')
+    args = parser.parse_args(argv)
+
+    app = load_app(args.database_uri)
+    manifest = build_dataset(
+        app, args.doctors, args.patients, args.appointments, seed=args.seed,
+        password=args.password, days_ahead=args.days_ahead, batch_size=args.batch_size
+    )
+    output = json.dumps(manifest, indent=2)
+    if args.manifest:
+        with open(args.manifest, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
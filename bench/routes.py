@@ -0,0 +1,318 @@
+"""
+Drive the blueprint routes at a given concurrency and report latency.
+
+    python -m bench.dataset --database-uri sqlite:////tmp/bench.db --manifest /tmp/bench.json
+    python -m bench.routes --manifest /tmp/bench.json --requests 200 --concurrency 8 --output after.json
+
+Every worker logs in once as a user of the scenario's role and then sends
+its share of --requests through the Flask test client, or over HTTP to a
+local threaded WSGI server with --server. The JSON report has p50/p95/p99
+latency, queries per request and status codes per scenario plus peak RSS,
+so runs on two commits can be diffed. Routes that delete, deactivate or
+cancel are left out so one dataset serves many runs.
+"""
+import argparse
+import json
+import logging
+import platform
+import random
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.cookiejar import CookieJar
+
+from bench.dataset import load_app, doctor_email, patient_email
+
+Scenario = namedtuple('Scenario', 'name role method path data')
+
+
+def _day(rng, m):
+    return (date.today() + timedelta(days=rng.randint(1, m['days_ahead']))).isoformat()
+
+
+def _slot(rng, m):
+    return rng.choice(m['slot_labels'])
+
+
+def _slot_doctor(slot_id, m):
+    return (slot_id - 1) // m['slots_per_doctor'] + 1
+
+
+def _booking(rng, m, me):
+    slot_id = rng.randint(m['first_slot_id'], m['last_slot_id'])
+    return {'avail_id': slot_id, 'doctor_id': _slot_doctor(slot_id, m)}
+
+
+def _path(template):
+    """A path template filled from the worker's rng, the manifest and the worker's own id."""
+    def build(rng, m, me):
+        return template.format(
+            me=me,
+            doctor=rng.randint(1, m['doctors']),
+            patient=rng.randint(1, m['patients']),
+            department=rng.randint(1, m['departments']),
+            appointment=rng.randint(1, m['appointments']),
+            term=rng.choice(m['search_terms']),
+            week_ago=(date.today() - timedelta(days=7)).isoformat(),
+        )
+    return build
+
+
+SCENARIOS = [
+    Scenario('auth.home', None, 'GET', _path('/'), None),
+    Scenario('auth.login', None, 'POST', _path('/login'), lambda rng, m, me: {
+        'email': patient_email(rng.randint(1, m['patients'])), 'password': m['password'],
+    }),
+
+    Scenario('admin.admin_dashboard', 'admin', 'GET', _path('/admin/dashboard'), None),
+    Scenario('admin.dashboard_doctors', 'admin', 'GET', _path('/admin/dashboard/doctors'), None),
+    Scenario('admin.dashboard_patients', 'admin', 'GET', _path('/admin/dashboard/patients'), None),
+    Scenario('admin.dashboard_appointments', 'admin', 'GET', _path('/admin/dashboard/appointments'), None),
+    Scenario('admin.view_doctor_details', 'admin', 'GET', _path('/admin/doctor/details/{doctor}'), None),
+    Scenario('admin.view_patient_details', 'admin', 'GET', _path('/admin/patient/details/{patient}'), None),
+    Scenario('admin.edit_doctor', 'admin', 'GET', _path('/admin/edit_doctor/{doctor}'), None),
+    Scenario('admin.edit_patient', 'admin', 'GET', _path('/admin/edit_patient/{patient}'), None),
+    Scenario('admin.patient_history', 'admin', 'GET', _path('/admin/patient_history/{patient}'), None),
+    Scenario('admin.export_appointments', 'admin', 'GET',
+             _path('/admin/export/appointments.ndjson?appt_from={week_ago}'), None),
+
+    Scenario('doctor.doctor_dashboard', 'doctor', 'GET', _path('/doctor/dashboard'), None),
+    Scenario('doctor.doctor_availability', 'doctor', 'GET', _path('/doctor/availability'), None),
+    Scenario('doctor.doctor_availability_json', 'doctor', 'GET', _path('/doctor/availability.json'), None),
+    Scenario('doctor.patient_history', 'doctor', 'GET', _path('/doctor/patient_history/{patient}'), None),
+    Scenario('doctor.update_history', 'doctor', 'GET', _path('/doctor/update_history/{appointment}'), None),
+    Scenario('doctor.toggle_availability_post', 'doctor', 'POST', _path('/doctor/availability/toggle'),
+             lambda rng, m, me: {'date': _day(rng, m), 'time_slot': _slot(rng, m)}),
+    Scenario('doctor.save_availability', 'doctor', 'POST', _path('/doctor/availability/save'),
+             lambda rng, m, me: {
+                 f'change_{_day(rng, m)}|{_slot(rng, m)}': rng.choice(('Available', 'Unavailable'))
+                 for _ in range(4)
+             }),
+
+    Scenario('patient.patient_dashboard', 'patient', 'GET', _path('/patient/dashboard'), None),
+    Scenario('patient.patient_appointments', 'patient', 'GET', _path('/patient/appointments'), None),
+    Scenario('patient.edit_profile', 'patient', 'GET', _path('/patient/edit_profile'), None),
+    Scenario('patient.department_details', 'patient', 'GET', _path('/patient/department/{department}'), None),
+    Scenario('patient.doctor_details', 'patient', 'GET', _path('/patient/doctor/{doctor}'), None),
+    Scenario('patient.doctor_availability_for_patient', 'patient', 'GET',
+             _path('/patient/doctor/{doctor}/availability'), None),
+    Scenario('patient.doctor_availability_json', 'patient', 'GET',
+             _path('/patient/doctor/{doctor}/availability.json'), None),
+    Scenario('patient.openings', 'patient', 'GET', _path('/patient/openings?department_id={department}'), None),
+    # The form's doctor_id wins over the one in the path.
+    Scenario('patient.book_slot', 'patient', 'POST', _path('/patient/doctor/{doctor}/availability'), _booking),
+
+    Scenario('search.admin', 'admin', 'GET', _path('/search/treatments?q={term}'), None),
+    Scenario('search.doctor', 'doctor', 'GET', _path('/search/treatments?q={term}'), None),
+    Scenario('search.patient', 'patient', 'GET', _path('/search/treatments?q={term}'), None),
+]
+
+
+class TestClientSession:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        response = self.client.open(path, method=method, data=data)
+        response.get_data()
+        return response.status_code, response.headers.get('X-Bench-Queries')
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar()), _NoRedirect()
+        )
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status, response.headers.get('X-Bench-Queries')
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code, e.headers.get('X-Bench-Queries')
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _login(session, role, rng, m):
+    if role is None:
+        return None
+    if role == 'admin':
+        me, email = None, m['admin_email']
+    elif role == 'doctor':
+        me = rng.randint(1, m['doctors'])
+        email = doctor_email(me)
+    else:
+        me = rng.randint(1, m['patients'])
+        email = patient_email(me)
+    status, _ = session.request('POST', '/login', {'email': email, 'password': m['password']})
+    if status != 302:
+        raise RuntimeError(f"login as {email} failed with {status}")
+    return me
+
+
+def run_scenario(scenario, new_session, manifest, requests, concurrency, seed):
+    """Run one scenario and return its latency, query and status summary."""
+    shares = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    samples = []
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(f'{seed}-{scenario.name}-{index}')
+        session = new_session()
+        me = _login(session, scenario.role, rng, manifest)
+        local = []
+        for _ in range(shares[index]):
+            path = scenario.path(rng, manifest, me)
+            data = scenario.data(rng, manifest, me) if scenario.data else None
+            started = time.perf_counter()
+            try:
+                status, queries = session.request(scenario.method, path, data)
+            except Exception:
+                status, queries = 'error', None
+            local.append((time.perf_counter() - started, status, queries))
+        with lock:
+            samples.extend(local)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, [i for i, share in enumerate(shares) if share]))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(s[0] * 1000 for s in samples)
+    queries = [int(s[2]) for s in samples if s[2] is not None]
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    return {
+        'endpoint': scenario.name,
+        'method': scenario.method,
+        'role': scenario.role,
+        'requests': len(samples),
+        'statuses': statuses,
+        'errors': sum(n for status, n in statuses.items() if status == 'error' or status.startswith('5')),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 50), 2) if latencies else None,
+            'p95': round(_percentile(latencies, 95), 2) if latencies else None,
+            'p99': round(_percentile(latencies, 99), 2) if latencies else None,
+            'max': round(latencies[-1], 2) if latencies else None,
+        },
+        'queries_per_request': {
+            'mean': round(sum(queries) / len(queries), 2) if queries else None,
+            'max': max(queries) if queries else None,
+        },
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _count_queries(response):
+    from flask import g
+    response.headers['X-Bench-Queries'] = str(g.get('query_count', 0))
+    return response
+
+
+def run(manifest, requests, concurrency, server=False, only=None, seed=0):
+    app = load_app(manifest['database_uri'])
+    app.after_request(_count_queries)
+
+    scenarios = [s for s in SCENARIOS if not only or any(o in s.name for o in only)]
+    httpd = None
+    if server:
+        from werkzeug.serving import make_server
+        # Per-request access logging would be measured along with the app.
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        httpd = make_server('127.0.0.1', 0, app, threaded=True)
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{httpd.server_port}'
+        new_session = lambda: HttpSession(base_url)  # noqa: E731
+    else:
+        new_session = lambda: TestClientSession(app)  # noqa: E731
+
+    started = time.perf_counter()
+    try:
+        results = [
+            run_scenario(scenario, new_session, manifest, requests, concurrency, seed)
+            for scenario in scenarios
+        ]
+    finally:
+        if httpd:
+            httpd.shutdown()
+
+    return {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'mode': 'wsgi-server' if server else 'test-client',
+        'concurrency': concurrency,
+        'requests_per_scenario': requests,
+        'dataset': {k: v for k, v in manifest.items() if k not in ('password', 'search_terms')},
+        'scenarios': results,
+        'elapsed_s': round(time.perf_counter() - started, 2),
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--manifest', required=True, help='JSON written by bench.dataset --manifest.')
+    parser.add_argument('--requests', type=int, default=100, help='Requests per scenario.')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--server', action='store_true', help='Go through a local threaded WSGI server.')
+    parser.add_argument('--only', action='append', help='Only scenarios whose name contains this (repeatable).')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the report here instead of stdout.')
+    args = parser.parse_args(argv)
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    report = run(manifest, args.requests, args.concurrency, args.server, args.only, args.seed)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 1 if any(s['errors'] for s in report['scenarios']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
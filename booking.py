@@ -0,0 +1,55 @@
+from datetime import datetime
+from sqlalchemy.exc import IntegrityError
+from models import db, Appointment, Availability
+from availability import bump_availability_version, claim_template_slot
+from metrics import BOOKINGS, BOOKING_CONFLICTS
+
+
+def book_slot(patient_id, doctor_id, slot_id=None, date=None, time_slot=None):
+    """
+    Claim an available slot and create its appointment in one transaction.
+    A stored slot is named by `slot_id`; a slot that only exists in the
+    doctor's weekly schedule by `date` and `time_slot`. The claim is a
+    conditional UPDATE (or, for schedule slots, an INSERT on the slot's
+    unique key), so when several patients race for the same slot only one
+    of them gets it; everyone else gets None back. The partial unique index
+    on booked appointments is the backstop if a slot is ever claimed twice
+    some other way.
+    """
+    if slot_id:
+        claimed = Availability.query.filter(
+            Availability.id == slot_id,
+            Availability.doctor_id == doctor_id,
+            Availability.status == 'Available',
+            Availability.end_at > datetime.now()
+        ).update({'status': 'Booked'}, synchronize_session=False) == 1
+        if claimed:
+            slot = db.session.get(Availability, slot_id)
+            date, time_slot = slot.date, slot.time_slot
+    else:
+        claimed = claim_template_slot(doctor_id, date, time_slot)
+
+    if not claimed:
+        db.session.rollback()
+        BOOKING_CONFLICTS.inc()
+        return None
+
+    bump_availability_version(doctor_id)
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        date=date,
+        time=time_slot,
+        status='Booked'
+    )
+    db.session.add(appointment)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        BOOKING_CONFLICTS.inc()
+        return None
+
+    BOOKINGS.inc()
+    return appointment
@@ -0,0 +1,74 @@
+import hashlib
+import os
+from functools import lru_cache
+from flask import current_app, g, request, make_response
+
+NO_STORE = 'no-store, no-cache, must-revalidate, max-age=0'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'private, no-cache'
+
+
+@lru_cache(maxsize=256)
+def _file_digest(path, mtime):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def fingerprint(filename):
+    path = os.path.join(current_app.static_folder, filename)
+    try:
+        return _file_digest(path, os.path.getmtime(path))
+    except OSError:
+        return None
+
+
+def add_static_fingerprint(endpoint, values):
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        version = fingerprint(values['filename'])
+        if version:
+            values['v'] = version
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def conditional(etag, last_modified=None):
+    """
+    Opt the current view into revalidation instead of no-store. Returns a
+    304 response when the client already holds this version, otherwise None
+    and the view renders as usual; the ETag is attached on the way out.
+    """
+    g.cache_etag = etag
+    g.cache_last_modified = last_modified
+
+    if request.if_none_match.contains(etag) or (
+        not request.if_none_match and last_modified and request.if_modified_since
+        and request.if_modified_since >= last_modified.replace(microsecond=0)
+    ):
+        return make_response('', 304)
+    return None
+
+
+def apply_cache_policy(response):
+    if request.endpoint == 'static':
+        if request.args.get('v'):
+            response.headers['Cache-Control'] = IMMUTABLE
+        return response
+
+    if 'cache_etag' in g:
+        response.headers['Cache-Control'] = REVALIDATE
+        response.set_etag(g.cache_etag)
+        if g.cache_last_modified:
+            response.last_modified = g.cache_last_modified
+        return response
+
+    response.headers['Cache-Control'] = NO_STORE
+    response.headers['Pragma'] = 'no-cache'
+    response.headers['Expires'] = '0'
+    return response
+
+
+def init_cache_policy(app):
+    app.url_defaults(add_static_fingerprint)
+    app.after_request(apply_cache_policy)
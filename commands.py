@@ -0,0 +1,87 @@
+import click
+from migrations import upgrade_database, MIGRATIONS
+from sweeper import sweep_expired_slots
+from archive import archive_old_rows
+from stats import rebuild_stats
+from importer import Importer, read_records
+from directory import invalidate_directory
+from export import EXPORT_FORMATS, export_statement, export_rows, export_lines
+from models import db
+
+
+def register_commands(app):
+
+    @app.cli.command('db-upgrade')
+    def db_upgrade():
+        """Apply pending schema migrations."""
+        applied = upgrade_database()
+        if applied:
+            click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        else:
+            click.echo(f"Database is up to date (version {MIGRATIONS[-1][0]}).")
+
+    @app.cli.command('sweep-slots')
+    def sweep_slots():
+        """Delete availability slots that have already ended."""
+        removed = sweep_expired_slots()
+        click.echo(f"Removed {removed} expired slot(s).")
+
+    @app.cli.command('archive')
+    @click.option('--before', type=click.DateTime(['%Y-%m-%d']),
+                  help='Archive appointments that started before this day (default: ARCHIVE_AFTER_DAYS ago).')
+    @click.option('--batch-size', type=int, default=lambda: app.config['ARCHIVE_BATCH_SIZE'],
+                  show_default='ARCHIVE_BATCH_SIZE', help='Appointments per transaction.')
+    def archive_command(before, batch_size):
+        """Move old completed and cancelled appointments to the archive tables."""
+        moved = archive_old_rows(before, batch_size)
+        click.echo(f"Archived {moved} appointment(s).")
+
+    @app.cli.command('rebuild-stats')
+    def rebuild_stats_command():
+        """Recompute the dashboard counters from the appointment tables."""
+        with db.engine.begin() as conn:
+            rebuild_stats(conn)
+        click.echo("Dashboard counters rebuilt.")
+
+    @app.cli.command('import')
+    @click.argument('kind', type=click.Choice(['doctors', 'patients']))
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+                  help='Input format (default: from the file extension).')
+    @click.option('--batch-size', type=int, default=lambda: app.config['IMPORT_BATCH_SIZE'],
+                  show_default='IMPORT_BATCH_SIZE', help='Rows per transaction.')
+    @click.option('--workers', type=int, help='Password hashing processes (default: CPU count).')
+    def import_command(kind, path, fmt, batch_size, workers):
+        """Bulk-load doctors or patients from a CSV or JSONL file."""
+        def report_error(line_number, reason):
+            click.echo(f"line {line_number}: {reason}", err=True)
+
+        def report_batch(imported, elapsed):
+            click.echo(f"{imported} imported ({imported / elapsed:.0f} rows/s)")
+
+        importer = Importer(
+            kind[:-1], batch_size=batch_size, workers=workers,
+            on_error=report_error, on_batch=report_batch
+        )
+        elapsed = importer.run(read_records(path, fmt))
+        if kind == 'doctors':
+            invalidate_directory()
+
+        rate = importer.imported / elapsed if elapsed else 0
+        click.echo(
+            f"Imported {importer.imported} {kind}, skipped {importer.skipped} "
+            f"in {elapsed:.1f}s ({rate:.0f} rows/s)."
+        )
+
+    @app.cli.command('export-appointments')
+    @click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+    @click.option('--from', 'date_from', type=click.DateTime(['%Y-%m-%d']), help='First day, inclusive.')
+    @click.option('--to', 'date_to', type=click.DateTime(['%Y-%m-%d']), help='Last day, inclusive.')
+    @click.option('--department', 'department_id', type=int, help='Department id.')
+    @click.option('--status', type=click.Choice(['Booked', 'Completed', 'Cancelled']),
+                  help='Only this status (default: all).')
+    @click.option('--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+    def export_appointments(fmt, date_from, date_to, department_id, status, output):
+        """Stream appointments with treatment, doctor and patient details."""
+        stmt = export_statement(date_from, date_to, department_id, status)
+        output.writelines(export_lines(fmt, export_rows(stmt)))
@@ -2,7 +2,62 @@ import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+
+def _database_uri():
+    uri = os.environ.get('DATABASE_URL', 'sqlite:///hospital.db')
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
 class Config:
-    SECRET_KEY = 'secret_key'  
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(BASE_DIR, 'hospital.db')
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key_here')
+    SQLALCHEMY_DATABASE_URI = _database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+
+    # SQLite connection pragmas
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+    # Connection pool (ignored for in-memory SQLite)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+
+    QUERY_BUDGET = 15
+    # Set-based cascades: a fixed number of statements however many rows go.
+    QUERY_BUDGETS = {
+        'admin.delete_doctor': 25,
+        'admin.delete_patient': 25,
+    }
+    # Statements slower than this are logged with their query plan (0 disables).
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 250))
+    SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG')
+    # Log the bound values of slow statements; they hold personal and medical data, so local debugging only.
+    SLOW_QUERY_LOG_PARAMS = os.environ.get('SLOW_QUERY_LOG_PARAMS', '0') == '1'
+    SLOWEST_QUERIES_PER_REQUEST = 3
+    # Bearer token /metrics requires when set; unset, only loopback clients may scrape.
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Serve /metrics to anyone, token or not.
+    METRICS_PUBLIC = os.environ.get('METRICS_PUBLIC', '0') == '1'
+    # Request profiling for admins (header) and a sampled share of requests.
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    PROFILE_HEADER = 'X-Profile'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 200))
+    ADMIN_PAGE_SIZE = 25
+    DIRECTORY_CACHE_TTL = int(os.environ.get('DIRECTORY_CACHE_TTL', 300))
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 1024))
+    # Seconds a cached login is trusted before its session_version is checked again.
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 10))
+    SLOT_SWEEP_INTERVAL = int(os.environ.get('SLOT_SWEEP_INTERVAL', 300))
+    # Finished appointments older than this move to the archive tables.
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 1000))
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 1000))
+    SEARCH_PAGE_SIZE = 20
+    HISTORY_PAGE_SIZE = 20
@@ -0,0 +1,98 @@
+import hashlib
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from models import Department, Doctor
+
+DepartmentEntry = namedtuple('DepartmentEntry', 'id name description')
+DoctorUserEntry = namedtuple('DoctorUserEntry', 'name active')
+DoctorEntry = namedtuple(
+    'DoctorEntry',
+    'id user specialization experience phone address availability department_id'
+)
+
+
+class Directory:
+    """
+    Read-only snapshot of departments and doctors for the patient-facing
+    browse pages. Entries are plain tuples, not ORM objects, so they can be
+    shared between requests and threads.
+    """
+
+    def __init__(self, departments, doctors):
+        self.version = hashlib.sha1(repr((departments, doctors)).encode()).hexdigest()
+        self.changed_at = datetime.now(timezone.utc)
+        self.departments = departments
+        self.doctors = {d.id: d for d in doctors}
+        self.departments_by_id = {d.id: d for d in departments}
+        self.active_doctors = [d for d in doctors if d.user.active]
+        self.doctors_by_department = {}
+        for doctor in doctors:
+            self.doctors_by_department.setdefault(doctor.department_id, []).append(doctor)
+
+    @classmethod
+    def load(cls):
+        departments = [
+            DepartmentEntry(d.id, d.name, d.description)
+            for d in Department.query.order_by(Department.id).all()
+        ]
+        doctors = [
+            DoctorEntry(
+                id=d.id,
+                user=DoctorUserEntry(d.user.name, bool(d.user.active)),
+                specialization=d.specialization,
+                experience=d.experience,
+                phone=d.phone,
+                address=d.address,
+                availability=d.availability,
+                department_id=d.department_id
+            )
+            for d in Doctor.query.options(joinedload(Doctor.user)).order_by(Doctor.id).all()
+        ]
+        return cls(departments, doctors)
+
+
+class DirectoryCache:
+    """
+    Per-process cache of the Directory with a TTL. Admin writes call
+    invalidate() so this worker sees them immediately; other workers pick
+    them up when their TTL runs out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._directory = None
+        self._expires_at = 0
+
+    def get(self):
+        directory = self._directory
+        if directory is not None and time.monotonic() < self._expires_at:
+            return directory
+
+        with self._lock:
+            if self._directory is None or time.monotonic() >= self._expires_at:
+                previous = self._directory
+                self._directory = Directory.load()
+                if previous and previous.version == self._directory.version:
+                    self._directory.changed_at = previous.changed_at
+                self._expires_at = time.monotonic() + current_app.config.get('DIRECTORY_CACHE_TTL', 300)
+            return self._directory
+
+    def invalidate(self):
+        with self._lock:
+            self._directory = None
+            self._expires_at = 0
+
+
+directory_cache = DirectoryCache()
+
+
+def get_directory():
+    return directory_cache.get()
+
+
+def invalidate_directory():
+    directory_cache.invalidate()
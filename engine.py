@@ -0,0 +1,85 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Upserts, the full-text index and the migrations are written for these.
+SUPPORTED_DIALECTS = ('sqlite', 'postgresql')
+
+
+def is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    options = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+    if not is_memory_sqlite(url):
+        options.setdefault('pool_size', config['DB_POOL_SIZE'])
+        options.setdefault('max_overflow', config['DB_MAX_OVERFLOW'])
+        options.setdefault('pool_recycle', config['DB_POOL_RECYCLE'])
+        options.setdefault('pool_pre_ping', config['DB_POOL_PRE_PING'])
+
+    if url.get_backend_name() == 'sqlite':
+        connect_args = dict(options.get('connect_args', {}))
+        connect_args.setdefault('timeout', config['SQLITE_BUSY_TIMEOUT_MS'] / 1000)
+        options['connect_args'] = connect_args
+
+    return options
+
+
+def apply_sqlite_pragmas(engine, config):
+    journal_mode = config['SQLITE_JOURNAL_MODE']
+    synchronous = config['SQLITE_SYNCHRONOUS']
+    busy_timeout = int(config['SQLITE_BUSY_TIMEOUT_MS'])
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        cursor.execute(f'PRAGMA synchronous={synchronous}')
+        cursor.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
+def describe_engine(engine, config):
+    settings = [f"database={engine.url.render_as_string(hide_password=True)}"]
+    if engine.dialect.name == 'sqlite':
+        settings += [
+            f"journal_mode={config['SQLITE_JOURNAL_MODE']}",
+            f"synchronous={config['SQLITE_SYNCHRONOUS']}",
+            f"busy_timeout={config['SQLITE_BUSY_TIMEOUT_MS']}ms",
+            "foreign_keys=ON",
+        ]
+    settings.append(f"pool={type(engine.pool).__name__}")
+    options = config['SQLALCHEMY_ENGINE_OPTIONS']
+    if 'pool_size' in options:
+        settings += [
+            f"pool_size={options['pool_size']}",
+            f"max_overflow={options['max_overflow']}",
+            f"pool_recycle={options['pool_recycle']}s",
+        ]
+    return ' '.join(settings)
+
+
+def init_engine(app, db):
+    """
+    Configure the SQLAlchemy engine from app.config and bind `db` to the app.
+    Must be called instead of db.init_app so the pool options are in place
+    before the engine is created. Databases other than SQLite and
+    PostgreSQL are refused here rather than failing request by request.
+    """
+    backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend not in SUPPORTED_DIALECTS:
+        raise RuntimeError(
+            f"Unsupported database {backend!r}; use one of: {', '.join(SUPPORTED_DIALECTS)}"
+        )
+
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == 'sqlite':
+            apply_sqlite_pragmas(engine, app.config)
+        app.logger.info("Database engine: %s", describe_engine(engine, app.config))
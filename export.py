@@ -0,0 +1,129 @@
+import csv
+import io
+import json
+from datetime import datetime, timedelta
+from sqlalchemy import or_, union_all
+from sqlalchemy.orm import aliased
+from models import (
+    db, User, Doctor, Patient, Appointment, Department, Treatment,
+    ArchivedAppointment, ArchivedTreatment
+)
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+doctor_user = aliased(User)
+patient_user = aliased(User)
+
+
+def _columns(appointment, treatment):
+    return [
+        ('appointment_id', appointment.id),
+        ('date', appointment.date),
+        ('time', appointment.time),
+        ('status', appointment.status),
+        ('start_at', appointment.start_at),
+        ('end_at', appointment.end_at),
+        ('doctor_id', Doctor.id),
+        ('doctor_name', doctor_user.name),
+        ('specialization', Doctor.specialization),
+        ('department', Department.name),
+        ('patient_id', Patient.id),
+        ('patient_name', patient_user.name),
+        ('patient_email', patient_user.email),
+        ('patient_age', Patient.age),
+        ('patient_gender', Patient.gender),
+        ('visit_type', treatment.visit_type),
+        ('tests_done', treatment.tests_done),
+        ('diagnosis', treatment.diagnosis),
+        ('prescription', treatment.prescription),
+        ('notes', treatment.notes),
+        ('followup_required', treatment.followup_required),
+    ]
+
+
+HEADER = [name for name, _ in _columns(Appointment, Treatment)]
+
+
+def _source_statement(appointment, treatment, date_from, date_to, department_id, status, q):
+    stmt = (
+        db.select(*[column.label(name) for name, column in _columns(appointment, treatment)])
+        .select_from(appointment)
+        .join(Doctor, appointment.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+        .join(Patient, appointment.patient_id == Patient.id)
+        .join(patient_user, Patient.user_id == patient_user.id)
+        .outerjoin(Department, Doctor.department_id == Department.id)
+        .outerjoin(treatment, treatment.appointment_id == appointment.id)
+    )
+
+    if date_from:
+        stmt = stmt.where(appointment.start_at >= date_from)
+    if date_to:
+        stmt = stmt.where(appointment.start_at < date_to + timedelta(days=1))
+    if department_id:
+        stmt = stmt.where(Doctor.department_id == department_id)
+    if status:
+        stmt = stmt.where(appointment.status == status)
+    if q:
+        pattern = f"%{q}%"
+        stmt = stmt.where(or_(patient_user.name.ilike(pattern), doctor_user.name.ilike(pattern)))
+    return stmt
+
+
+def export_statement(date_from=None, date_to=None, department_id=None, status=None, q=None):
+    """
+    One flat SELECT over appointments, live and archived, with their
+    treatment, doctor and patient. `date_from`/`date_to` are inclusive
+    days; an empty status exports every status, cancelled appointments
+    included.
+    """
+    filters = (date_from, date_to, department_id, status, q)
+    rows = union_all(
+        _source_statement(Appointment, Treatment, *filters),
+        _source_statement(ArchivedAppointment, ArchivedTreatment, *filters),
+    ).subquery()
+    return db.select(rows).order_by(rows.c.appointment_id)
+
+
+def export_rows(stmt, batch_size=1000):
+    """
+    Stream result rows `batch_size` at a time. yield_per asks the driver
+    for a server-side cursor where it has one, so memory stays flat no
+    matter how many rows match.
+    """
+    result = db.session.execute(stmt, execution_options={'yield_per': batch_size})
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return value
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(values):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    yield line(HEADER)
+    for row in rows:
+        yield line([_value(v) for v in row])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps({name: _value(v) for name, v in zip(HEADER, row)}) + '\n'
+
+
+def export_lines(fmt, rows):
+    return csv_lines(rows) if fmt == 'csv' else ndjson_lines(rows)
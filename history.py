@@ -0,0 +1,53 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models import Doctor, Appointment, ArchivedAppointment
+from pagination import keyset_page, decode_cursor, encode_cursor
+
+# Appointments whose date never parsed sort as the oldest visits.
+UNDATED = datetime(1900, 1, 1)
+
+
+def _visit_key(appointment):
+    return (appointment.start_at or UNDATED, appointment.id)
+
+
+def _source_page(model, patient_id, doctor_id, after, per_page):
+    query = model.query.options(
+        joinedload(model.treatment),
+        joinedload(model.doctor).joinedload(Doctor.user)
+    ).filter(model.patient_id == patient_id)
+    if doctor_id is not None:
+        query = query.filter(model.doctor_id == doctor_id)
+
+    started = func.coalesce(model.start_at, UNDATED)
+    return keyset_page(query, [started, model.id], after, per_page, key_of=_visit_key, descending=True)
+
+
+def history_page(patient_id, doctor_id=None, after=None):
+    """
+    One page of a patient's visits, newest first, with each visit's
+    treatment and doctor loaded in the same query. Live and archived
+    appointments are paged with the same cursor and merged, so callers see
+    one history. Pass doctor_id to limit the history to one doctor's
+    appointments. Returns (appointments, next_cursor) like keyset_page.
+    """
+    per_page = current_app.config.get('HISTORY_PAGE_SIZE', 20)
+    after = decode_cursor(after, [datetime.fromisoformat, int])
+
+    merged = []
+    more = False
+    for model in (Appointment, ArchivedAppointment):
+        rows, next_cursor = _source_page(model, patient_id, doctor_id, after, per_page)
+        merged.extend(rows)
+        more = more or next_cursor is not None
+    merged.sort(key=_visit_key, reverse=True)
+
+    # Archived rows keep their ids, which are never reused (AUTOINCREMENT on
+    # SQLite, sequences elsewhere), so the key stays total.
+    next_cursor = None
+    if len(merged) > per_page or more:
+        merged = merged[:per_page]
+        next_cursor = encode_cursor(_visit_key(merged[-1]))
+    return merged, next_cursor
@@ -0,0 +1,183 @@
+import heapq
+import logging
+import re
+import time
+from flask import g, has_app_context, has_request_context, request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+EXPLAINABLE = ('select', 'insert', 'update', 'delete', 'with')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def _one_line(statement, limit=300):
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return statement if len(statement) <= limit else statement[:limit] + '…'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+
+    if has_request_context():
+        g.query_time = g.get('query_time', 0.0) + elapsed
+        # Min-heap of the N slowest statements so far in this request.
+        slowest = g.setdefault('slowest_queries', [])
+        heapq.heappush(slowest, (elapsed, g.query_count, statement))
+        if len(slowest) > current_app.config.get('SLOWEST_QUERIES_PER_REQUEST', 3):
+            heapq.heappop(slowest)
+
+    if has_app_context():
+        threshold = current_app.config.get('SLOW_QUERY_MS')
+        if threshold and elapsed * 1000 >= threshold:
+            log_slow_query(conn, statement, parameters[0] if executemany else parameters, elapsed)
+
+
+@event.listens_for(Engine, 'handle_error')
+def _failed_query(context):
+    started = context.connection.info.get('query_started') if context.connection else None
+    if started:
+        started.pop()
+
+
+def explain(conn, statement, parameters):
+    """
+    The database's plan for `statement`, as text, or None for statements
+    that have no plan. Runs on the raw DBAPI connection so it is neither
+    counted nor timed; on PostgreSQL a savepoint keeps a failing EXPLAIN
+    from aborting the caller's transaction.
+    """
+    if statement.lstrip().split(None, 1)[0].lower() not in EXPLAINABLE:
+        return None
+
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+
+    savepoint = dialect == 'postgresql'
+    cursor = conn.connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute('SAVEPOINT slow_query_plan')
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+        if savepoint:
+            cursor.execute('RELEASE SAVEPOINT slow_query_plan')
+    except Exception as e:
+        if savepoint:
+            try:
+                cursor.execute('ROLLBACK TO SAVEPOINT slow_query_plan')
+            except Exception:
+                pass
+        return f"(no plan: {e})"
+    finally:
+        cursor.close()
+
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail); indent each step under its parent.
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return '\n'.join(lines)
+    return '\n'.join(row[0] for row in rows)
+
+
+def _redacted(parameters):
+    count = len(parameters) if parameters else 0
+    return f"({count} redacted; set SLOW_QUERY_LOG_PARAMS to log them)"
+
+
+def log_slow_query(conn, statement, parameters, elapsed):
+    """
+    Log a slow statement with its plan. Bound values (emails, password
+    hashes, diagnoses) stay out of the log unless SLOW_QUERY_LOG_PARAMS is
+    set; PostgreSQL prints them inside its plans too, so quoted literals
+    there are masked as well.
+    """
+    where = request.endpoint if has_request_context() else 'outside a request'
+    plan = explain(conn, statement, parameters)
+    if current_app.config.get('SLOW_QUERY_LOG_PARAMS'):
+        shown = _one_line(repr(parameters), 500)
+    else:
+        shown = _redacted(parameters)
+        if plan:
+            plan = re.sub(r"'(?:[^']|'')*'", "'?'", plan)
+    current_app.logger.getChild('slow_queries').warning(
+        "Slow query (%.1f ms, %s)\n%s\nParameters: %s\nPlan:\n%s",
+        elapsed * 1000, where, _one_line(statement, 4000), shown, plan or '(none)'
+    )
+
+
+def query_budget_for(endpoint):
+    budgets = current_app.config.get('QUERY_BUDGETS', {})
+    if endpoint in budgets:
+        return budgets[endpoint]
+    return current_app.config.get('QUERY_BUDGET')
+
+
+def reset_query_stats():
+    # g outlives the request when an app context was already pushed (tests, scripts).
+    g.query_count = 0
+    g.query_time = 0.0
+    g.slowest_queries = []
+
+
+def check_query_budget(response):
+    count = g.get('query_count', 0)
+    budget = query_budget_for(request.endpoint)
+
+    if budget is not None and count > budget:
+        message = f"{request.endpoint} ran {count} queries (budget {budget})"
+        if current_app.testing:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+
+    if current_app.debug or current_app.testing:
+        db_ms = g.get('query_time', 0.0) * 1000
+        response.headers['X-Query-Count'] = str(count)
+        response.headers['X-Query-Time-Ms'] = f"{db_ms:.1f}"
+        response.headers['Server-Timing'] = f'db;dur={db_ms:.1f};desc="{count} queries"'
+    if current_app.debug:
+        log_request_queries(count)
+    return response
+
+
+def log_request_queries(count):
+    slowest = sorted(g.get('slowest_queries', []), reverse=True)
+    current_app.logger.info(
+        "%s %s: %d queries, %.1f ms in the database%s",
+        request.method, request.path, count, g.get('query_time', 0.0) * 1000,
+        ''.join(f"\n  {elapsed * 1000:.1f} ms  {_one_line(statement)}" for elapsed, _, statement in slowest)
+    )
+
+
+def init_instrumentation(app):
+    app.config.setdefault('QUERY_BUDGET', None)
+    app.config.setdefault('QUERY_BUDGETS', {})
+    app.config.setdefault('SLOW_QUERY_MS', None)
+    app.config.setdefault('SLOWEST_QUERIES_PER_REQUEST', 3)
+
+    path = app.config.get('SLOW_QUERY_LOG')
+    if path:
+        handler = logging.FileHandler(path)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        app.logger.getChild('slow_queries').addHandler(handler)
+
+    app.before_request(reset_query_stats)
+    app.after_request(check_query_budget)
@@ -0,0 +1,204 @@
+import bisect
+import hmac
+import ipaddress
+import threading
+import time
+from flask import Response, abort, current_app, g, request
+from models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    )
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        if not values and not self.labels:
+            values = [((), 0)]
+        lines += [f'{self.name}{_labels(self.labels, key)} {value}' for key, value in values]
+        return lines
+
+
+class Gauge:
+    """A gauge set by the app, or read from `collect` at scrape time."""
+
+    def __init__(self, name, help, collect=None):
+        self.name = name
+        self.help = help
+        self.collect = collect
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def render(self):
+        value = self.collect() if self.collect else self._value
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        if value is not None:
+            lines.append(f'{self.name} {value}')
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Observations only bump one bucket under a lock;
+    the cumulative counts Prometheus expects are built at scrape time.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                labels = _labels(self.labels + ('le',), key + (bound,))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def _pool_stat(method):
+    def collect():
+        pool = db.engine.pool
+        if not hasattr(pool, method):
+            return None
+        # QueuePool counts overflow up from -pool_size.
+        return max(getattr(pool, method)(), 0)
+    return collect
+
+
+REQUESTS = Counter(
+    'hms_http_requests_total', 'HTTP requests by endpoint, method and status.',
+    ('endpoint', 'method', 'status')
+)
+LATENCY = Histogram(
+    'hms_http_request_duration_seconds', 'Time to produce the response, by endpoint and status.',
+    ('endpoint', 'status')
+)
+IN_FLIGHT = Gauge('hms_http_requests_in_flight', 'Requests being handled by this process.')
+BOOKINGS = Counter('hms_bookings_total', 'Appointments booked.')
+BOOKING_CONFLICTS = Counter('hms_booking_conflicts_total', 'Bookings refused because the slot was taken.')
+CANCELLATIONS = Counter('hms_cancellations_total', 'Appointments cancelled by patients.')
+
+METRICS = [
+    REQUESTS,
+    LATENCY,
+    IN_FLIGHT,
+    Gauge('hms_db_pool_size', 'Configured connection pool size.', _pool_stat('size')),
+    Gauge('hms_db_pool_checked_out', 'Connections currently in use.', _pool_stat('checkedout')),
+    Gauge('hms_db_pool_checked_in', 'Idle connections in the pool.', _pool_stat('checkedin')),
+    Gauge('hms_db_pool_overflow', 'Connections opened beyond the pool size.', _pool_stat('overflow')),
+    BOOKINGS,
+    BOOKING_CONFLICTS,
+    CANCELLATIONS,
+]
+
+
+def render_metrics():
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
+
+
+def _start_request():
+    g.metrics_started = time.perf_counter()
+    IN_FLIGHT.inc()
+
+
+def _record_request(response):
+    started = g.get('metrics_started')
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        status = str(response.status_code)
+        REQUESTS.inc(endpoint, request.method, status)
+        LATENCY.observe(time.perf_counter() - started, endpoint, status)
+    return response
+
+
+def _finish_request(exc):
+    if g.pop('metrics_started', None) is not None:
+        IN_FLIGHT.dec()
+
+
+def _is_loopback(address):
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def metrics_view():
+    """
+    Prometheus text exposition of this process's metrics. Closed by
+    default: when METRICS_TOKEN is set the scraper must send it as a
+    bearer token, otherwise only loopback clients get through.
+    METRICS_PUBLIC opens the endpoint to everyone.
+    """
+    if not current_app.config.get('METRICS_PUBLIC'):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token:
+            sent = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(sent, f'Bearer {token}'):
+                abort(401)
+        elif not _is_loopback(request.remote_addr or ''):
+            abort(403)
+    return Response(render_metrics(), content_type=CONTENT_TYPE)
+
+
+def init_metrics(app):
+    app.config.setdefault('METRICS_TOKEN', None)
+    app.config.setdefault('METRICS_PUBLIC', False)
+    app.before_request(_start_request)
+    app.after_request(_record_request)
+    app.teardown_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,318 @@
+from contextlib import contextmanager
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect, text, bindparam
+from sqlalchemy.schema import AddConstraint, CreateTable
+from models import (
+    db, User, Department, Doctor, Patient, Appointment, Treatment, Availability,
+    DashboardStat, DoctorPatientCount, ArchivedAppointment, ArchivedTreatment, ScheduleTemplate
+)
+from stats import rebuild_stats
+from search import create_search_index
+from timeslots import slot_bounds
+
+schema_migrations = db.Table(
+    'schema_migrations',
+    db.Column('version', db.Integer, primary_key=True),
+    db.Column('description', db.String(200)),
+    db.Column('applied_at', db.DateTime, default=datetime.utcnow)
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def decorator(fn):
+        MIGRATIONS.append((version, description, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def create_index(conn, name, table, columns, unique=False, where=None):
+    """
+    CREATE INDEX IF NOT EXISTS with the definition spelled out, so a
+    migration builds the same index however the models change later.
+    """
+    ddl = f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+    if where:
+        ddl += f" WHERE {where}"
+    conn.execute(text(ddl))
+
+
+def add_column(conn, table, column):
+    existing = {c['name'] for c in inspect(conn).get_columns(table.name)}
+    if column.name in existing:
+        return
+    column_type = column.type.compile(conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def rebuild_foreign_keys(conn, table):
+    """
+    Bring a table's foreign keys in line with the model. SQLite cannot alter
+    constraints, so the table is recreated from the model; other databases
+    swap the constraints.
+    """
+    if conn.dialect.name != 'sqlite':
+        for fk in inspect(conn).get_foreign_keys(table.name):
+            conn.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT {fk["name"]}'))
+        for constraint in table.foreign_key_constraints:
+            conn.execute(AddConstraint(constraint))
+        return
+    recreate_sqlite_table(conn, table)
+
+
+def recreate_sqlite_table(conn, table):
+    """
+    Recreate a SQLite table from the model and copy its rows across. The
+    runner has foreign key enforcement off, so dropping the old table
+    cascades nothing. Triggers on the table are dropped with it.
+    """
+    staging = f'{table.name}_rebuild'
+    ddl = str(CreateTable(table).compile(conn)).strip()
+    conn.execute(text(ddl.replace(f'CREATE TABLE {table.name} ', f'CREATE TABLE {staging} ', 1)))
+    columns = ', '.join(c.name for c in table.columns)
+    conn.execute(text(f'INSERT INTO {staging} ({columns}) SELECT {columns} FROM {table.name}'))
+    conn.execute(text(f'DROP TABLE {table.name}'))
+    conn.execute(text(f'ALTER TABLE {staging} RENAME TO {table.name}'))
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+def backfill_slot_times(conn, table, time_column, batch_size=1000):
+    update = table.update().where(table.c.id == bindparam('row_id')).values(
+        start_at=bindparam('new_start_at'), end_at=bindparam('new_end_at')
+    )
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            db.select(table.c.id, table.c.date, time_column)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for row_id, date_str, slot in rows:
+            start_at, end_at = slot_bounds(date_str, slot)
+            params.append({'row_id': row_id, 'new_start_at': start_at, 'new_end_at': end_at})
+        conn.execute(update, params)
+        last_id = rows[-1][0]
+
+
+@migration(1, 'Index foreign keys and filter columns, unique availability slots')
+def index_lookup_columns(conn):
+    # Keep one row per slot before it becomes unique: the Booked one if
+    # any, otherwise the newest.
+    removed = conn.execute(text(
+        "DELETE FROM availabilities WHERE id NOT IN ("
+        "SELECT id FROM ("
+        "SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY doctor_id, date, time_slot "
+        "ORDER BY CASE WHEN status = 'Booked' THEN 0 ELSE 1 END, id DESC"
+        ") AS position FROM availabilities"
+        ") ranked WHERE position = 1)"
+    )).rowcount
+    if removed:
+        current_app.logger.warning("Removed %d duplicate availability slot(s)", removed)
+
+    create_index(conn, 'ix_doctors_user_id', 'doctors', ['user_id'])
+    create_index(conn, 'ix_doctors_department_id', 'doctors', ['department_id'])
+    create_index(conn, 'ix_patients_user_id', 'patients', ['user_id'])
+    create_index(conn, 'ix_appointments_doctor_date', 'appointments', ['doctor_id', 'date'])
+    create_index(conn, 'ix_appointments_patient_date', 'appointments', ['patient_id', 'date'])
+    create_index(conn, 'ix_appointments_status_date', 'appointments', ['status', 'date'])
+    create_index(conn, 'ix_treatments_appointment_id', 'treatments', ['appointment_id'])
+    create_index(conn, 'uq_availabilities_doctor_date_slot', 'availabilities',
+                 ['doctor_id', 'date', 'time_slot'], unique=True)
+    create_index(conn, 'ix_availabilities_date', 'availabilities', ['date'])
+
+
+@migration(2, 'Typed start_at/end_at on appointments and availabilities')
+def add_slot_times(conn):
+    appointments = Appointment.__table__
+    availabilities = Availability.__table__
+
+    for table in (appointments, availabilities):
+        add_column(conn, table, table.c.start_at)
+        add_column(conn, table, table.c.end_at)
+
+    backfill_slot_times(conn, appointments, appointments.c.time)
+    backfill_slot_times(conn, availabilities, availabilities.c.time_slot)
+
+    create_index(conn, 'ix_appointments_start_at', 'appointments', ['start_at'])
+    create_index(conn, 'ix_availabilities_doctor_start_at', 'availabilities', ['doctor_id', 'start_at'])
+    create_index(conn, 'ix_availabilities_end_at', 'availabilities', ['end_at'])
+
+
+@migration(3, 'Unique booked appointment per doctor slot')
+def unique_booked_slot(conn):
+    cancelled = conn.execute(text(
+        "UPDATE appointments SET status = 'Cancelled' "
+        "WHERE status = 'Booked' AND id NOT IN ("
+        "SELECT MIN(id) FROM appointments WHERE status = 'Booked' "
+        "GROUP BY doctor_id, date, time)"
+    )).rowcount
+    if cancelled:
+        current_app.logger.warning("Cancelled %d double-booked appointment(s)", cancelled)
+
+    create_index(conn, 'uq_appointments_booked_slot', 'appointments', ['doctor_id', 'date', 'time'],
+                 unique=True, where="status = 'Booked'")
+
+
+@migration(4, 'Dashboard counters per hospital and per doctor')
+def add_dashboard_stats(conn):
+    DashboardStat.__table__.create(conn, checkfirst=True)
+    DoctorPatientCount.__table__.create(conn, checkfirst=True)
+    rebuild_stats(conn)
+
+
+@migration(5, 'Availability version per doctor for grid ETags')
+def add_availability_version(conn):
+    doctors = Doctor.__table__
+    add_column(conn, doctors, doctors.c.availability_version)
+    conn.execute(doctors.update().where(doctors.c.availability_version.is_(None)).values(availability_version=0))
+
+
+@migration(6, 'Full-text search index over treatments')
+def add_treatment_search(conn):
+    create_search_index(conn)
+
+
+@migration(7, 'ON DELETE rules on every foreign key')
+def add_delete_rules(conn):
+    users, doctors, patients = User.__table__, Doctor.__table__, Patient.__table__
+    appointments, treatments, availabilities = Appointment.__table__, Treatment.__table__, Availability.__table__
+
+    # Rows orphaned by the old delete routes would fail the new constraints.
+    conn.execute(doctors.delete().where(doctors.c.user_id.not_in(db.select(users.c.id))))
+    conn.execute(patients.delete().where(patients.c.user_id.not_in(db.select(users.c.id))))
+    conn.execute(appointments.delete().where(
+        appointments.c.doctor_id.not_in(db.select(doctors.c.id))
+        | appointments.c.patient_id.not_in(db.select(patients.c.id))
+    ))
+    conn.execute(treatments.delete().where(treatments.c.appointment_id.not_in(db.select(appointments.c.id))))
+    conn.execute(availabilities.delete().where(availabilities.c.doctor_id.not_in(db.select(doctors.c.id))))
+    conn.execute(doctors.update().where(
+        doctors.c.department_id.not_in(db.select(Department.__table__.c.id))
+    ).values(department_id=None))
+
+    # The models also carry AUTOINCREMENT for appointments and treatments,
+    # so the rebuilt SQLite tables never reuse ids (see migration 10).
+    for table in (doctors, patients, appointments, treatments, availabilities):
+        rebuild_foreign_keys(conn, table)
+
+    if conn.dialect.name == 'sqlite':
+        create_search_index(conn)
+        violations = conn.execute(text('PRAGMA foreign_key_check')).fetchall()
+        if violations:
+            raise RuntimeError(f"Foreign key violations after rebuild: {violations[:5]}")
+
+    rebuild_stats(conn)
+
+
+@migration(8, 'Archive tables for old appointments and treatments')
+def add_archive_tables(conn):
+    # Table.create also builds the indexes and, for treatments, the search index.
+    for model in (ArchivedAppointment, ArchivedTreatment):
+        model.__table__.create(conn, checkfirst=True)
+
+
+@migration(9, 'Recurring weekly schedule templates')
+def add_schedule_templates(conn):
+    ScheduleTemplate.__table__.create(conn, checkfirst=True)
+
+
+@migration(10, 'Never reuse appointment and treatment ids on SQLite')
+def autoincrement_ids(conn):
+    if conn.dialect.name != 'sqlite':
+        return
+    pairs = (
+        (Appointment.__table__, ArchivedAppointment.__table__),
+        (Treatment.__table__, ArchivedTreatment.__table__),
+    )
+    for table, archive in pairs:
+        ddl = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': table.name}
+        ).scalar()
+        if 'AUTOINCREMENT' not in ddl.upper():
+            recreate_sqlite_table(conn, table)
+        # Ids already handed to archived rows must not come back either.
+        conn.execute(text('DELETE FROM sqlite_sequence WHERE name = :name'), {'name': table.name})
+        conn.execute(text(
+            f"INSERT INTO sqlite_sequence (name, seq) SELECT :name, max("
+            f"(SELECT coalesce(max(id), 0) FROM {table.name}), "
+            f"(SELECT coalesce(max(id), 0) FROM {archive.name}))"
+        ), {'name': table.name})
+    create_search_index(conn)
+
+
+@migration(11, 'Session version per user for the user loader cache')
+def add_session_version(conn):
+    users = User.__table__
+    add_column(conn, users, users.c.session_version)
+    conn.execute(users.update().where(users.c.session_version.is_(None)).values(session_version=0))
+
+
+def applied_versions(conn):
+    return {row[0] for row in conn.execute(db.select(schema_migrations.c.version))}
+
+
+def _stamp(conn, version, description):
+    conn.execute(schema_migrations.insert().values(
+        version=version, description=description, applied_at=datetime.utcnow()
+    ))
+
+
+@contextmanager
+def _migration_transaction(engine):
+    """
+    engine.begin() for one migration, with SQLite foreign key enforcement
+    switched off for its duration so tables can be rebuilt. The pragma is
+    a no-op inside a transaction, hence the separate connection setup.
+    """
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == 'sqlite'
+        if sqlite:
+            conn.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            conn.commit()
+        try:
+            with conn.begin():
+                yield conn
+        finally:
+            if sqlite:
+                conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+                conn.commit()
+
+
+def upgrade_database():
+    """
+    Bring the database up to the latest schema version.
+    A brand new database is created from the models and stamped with every
+    migration; an existing one only runs the migrations it has not seen yet,
+    each in its own transaction. Returns the list of versions applied.
+    """
+    engine = db.engine
+
+    with engine.begin() as conn:
+        if not inspect(conn).has_table('users'):
+            db.metadata.create_all(conn)
+            for version, description, _ in MIGRATIONS:
+                _stamp(conn, version, description)
+            return [version for version, _, _ in MIGRATIONS]
+
+        schema_migrations.create(conn, checkfirst=True)
+        done = applied_versions(conn)
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version in done:
+            continue
+        with _migration_transaction(engine) as conn:
+            fn(conn)
+            _stamp(conn, version, description)
+        applied.append(version)
+
+    return applied
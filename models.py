@@ -1,5 +1,6 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from timeslots import slot_bounds
 
 db = SQLAlchemy()
 
@@ -12,9 +13,10 @@ class User(UserMixin, db.Model):
     password = db.Column(db.String(200), nullable=False)
     role = db.Column(db.String(20), nullable=False) 
     active = db.Column(db.Boolean, default=True)  
+    session_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
-    doctor = db.relationship('Doctor', backref='user', uselist=False)
-    patient = db.relationship('Patient', backref='user', uselist=False)
+    doctor = db.relationship('Doctor', backref='user', uselist=False, cascade='all', passive_deletes=True)
+    patient = db.relationship('Patient', backref='user', uselist=False, cascade='all', passive_deletes=True)
 
     def __repr__(self):
         return f"<User {self.name} - {self.role}>"
@@ -25,7 +27,7 @@ class Department(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    doctors = db.relationship('Doctor', backref='department', lazy=True)
+    doctors = db.relationship('Doctor', backref='department', lazy=True, passive_deletes=True)
 
     def __repr__(self):
         return f"<Department {self.name}>"
@@ -34,7 +36,7 @@ class Doctor(db.Model):
     __tablename__ = 'doctors'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
 
     specialization = db.Column(db.String(100), nullable=False)
     experience = db.Column(db.Integer)  
@@ -42,9 +44,15 @@ class Doctor(db.Model):
     address = db.Column(db.String(200))
 
     availability = db.Column(db.String(100))
-    department_id = db.Column(db.Integer, db.ForeignKey('departments.id'))
+    department_id = db.Column(db.Integer, db.ForeignKey('departments.id', ondelete='SET NULL'))
+    availability_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
-    appointments = db.relationship('Appointment', backref='doctor', lazy=True)
+    __table_args__ = (
+        db.Index('ix_doctors_user_id', 'user_id'),
+        db.Index('ix_doctors_department_id', 'department_id'),
+    )
+
+    appointments = db.relationship('Appointment', backref='doctor', lazy=True, cascade='all', passive_deletes=True)
 
     def __repr__(self):
         return f"<Doctor {self.user.name} ({self.specialization})>"
@@ -54,13 +62,17 @@ class Patient(db.Model):
     __tablename__ = 'patients'
 
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     age = db.Column(db.Integer)
     gender = db.Column(db.String(10))
     phone = db.Column(db.String(15))
     address = db.Column(db.String(200))
 
-    appointments = db.relationship('Appointment', backref='patient', lazy=True)
+    __table_args__ = (
+        db.Index('ix_patients_user_id', 'user_id'),
+    )
+
+    appointments = db.relationship('Appointment', backref='patient', lazy=True, cascade='all', passive_deletes=True)
 
     def __repr__(self):
         return f"<Patient {self.user.name}>"
@@ -70,13 +82,32 @@ class Appointment(db.Model):
     __tablename__ = 'appointments'
 
     id = db.Column(db.Integer, primary_key=True)
-    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
     date = db.Column(db.String(20))
     time = db.Column(db.String(20))
     status = db.Column(db.String(20), default='Booked')  
+    start_at = db.Column(db.DateTime)
+    end_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_appointments_doctor_date', 'doctor_id', 'date'),
+        db.Index('ix_appointments_patient_date', 'patient_id', 'date'),
+        db.Index('ix_appointments_status_date', 'status', 'date'),
+        db.Index('ix_appointments_start_at', 'start_at'),
+        db.Index(
+            'uq_appointments_booked_slot', 'doctor_id', 'date', 'time',
+            unique=True,
+            sqlite_where=db.text("status = 'Booked'"),
+            postgresql_where=db.text("status = 'Booked'")
+        ),
+        # Archived rows keep their ids, so SQLite must never hand a deleted id out again.
+        {'sqlite_autoincrement': True},
+    )
+
+    treatment = db.relationship('Treatment', backref='appointment', uselist=False, cascade='all', passive_deletes=True)
 
-    treatment = db.relationship('Treatment', backref='appointment', uselist=False)
+    archived = False
 
     def __repr__(self):
         return f"<Appointment {self.id} - {self.status}>"
@@ -86,7 +117,7 @@ class Treatment(db.Model):
     __tablename__ = 'treatments'
 
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id', ondelete='CASCADE'), nullable=False)
     visit_type = db.Column(db.String(100))
     tests_done = db.Column(db.Text)
     diagnosis = db.Column(db.Text)
@@ -94,6 +125,11 @@ class Treatment(db.Model):
     notes = db.Column(db.Text)
     followup_required = db.Column(db.String(5))
 
+    __table_args__ = (
+        db.Index('ix_treatments_appointment_id', 'appointment_id'),
+        {'sqlite_autoincrement': True},
+    )
+
     def __repr__(self):
         return f"<Treatment for Appointment {self.appointment_id}>"
     
@@ -101,11 +137,130 @@ class Availability(db.Model):
     __tablename__ = 'availabilities'
 
     id = db.Column(db.Integer, primary_key=True)
-    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
     date = db.Column(db.String(20), nullable=False)
     time_slot = db.Column(db.String(20), nullable=False)
     status = db.Column(db.String(10), default='Available') 
+    start_at = db.Column(db.DateTime)
+    end_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('uq_availabilities_doctor_date_slot', 'doctor_id', 'date', 'time_slot', unique=True),
+        db.Index('ix_availabilities_date', 'date'),
+        db.Index('ix_availabilities_doctor_start_at', 'doctor_id', 'start_at'),
+        db.Index('ix_availabilities_end_at', 'end_at'),
+    )
 
     def __repr__(self):
         return f"<Availability {self.date} {self.time_slot} - {self.status}>"
 
+
+class ScheduleTemplate(db.Model):
+    """
+    A recurring weekly opening, e.g. Mondays 08:00-12:00 in 30-minute
+    slots. Slots are expanded from these on read; only bookings and
+    per-date overrides are stored in `availabilities`.
+    """
+    __tablename__ = 'schedule_templates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
+    weekday = db.Column(db.Integer, nullable=False)  # Monday is 0
+    start_time = db.Column(db.String(5), nullable=False)  # HH:MM
+    end_time = db.Column(db.String(5), nullable=False)
+    slot_minutes = db.Column(db.Integer)  # None: one slot for the whole window
+
+    __table_args__ = (
+        db.Index('ix_schedule_templates_doctor_id', 'doctor_id'),
+    )
+
+    def __repr__(self):
+        return f"<ScheduleTemplate {self.doctor_id} {self.weekday} {self.start_time}-{self.end_time}>"
+
+
+
+class DashboardStat(db.Model):
+    __tablename__ = 'dashboard_stats'
+
+    scope = db.Column(db.String(20), primary_key=True)
+    scope_id = db.Column(db.Integer, primary_key=True, default=0)
+    doctors = db.Column(db.Integer, nullable=False, default=0)
+    patients = db.Column(db.Integer, nullable=False, default=0)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+    completed = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DashboardStat {self.scope}:{self.scope_id}>"
+
+
+class DoctorPatientCount(db.Model):
+    __tablename__ = 'doctor_patient_counts'
+
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, primary_key=True)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DoctorPatientCount {self.doctor_id}/{self.patient_id}>"
+
+
+class ArchivedAppointment(db.Model):
+    """A completed or cancelled appointment moved out of `appointments` by `flask archive`; ids are kept."""
+    __tablename__ = 'appointments_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id', ondelete='CASCADE'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id', ondelete='CASCADE'), nullable=False)
+    date = db.Column(db.String(20))
+    time = db.Column(db.String(20))
+    status = db.Column(db.String(20))
+    start_at = db.Column(db.DateTime)
+    end_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_appointments_archive_patient_start_at', 'patient_id', 'start_at'),
+        db.Index('ix_appointments_archive_doctor_start_at', 'doctor_id', 'start_at'),
+    )
+
+    doctor = db.relationship('Doctor')
+    patient = db.relationship('Patient')
+    treatment = db.relationship('ArchivedTreatment', backref='appointment', uselist=False, cascade='all', passive_deletes=True)
+
+    archived = True
+
+    def __repr__(self):
+        return f"<ArchivedAppointment {self.id} - {self.status}>"
+
+
+class ArchivedTreatment(db.Model):
+    __tablename__ = 'treatments_archive'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments_archive.id', ondelete='CASCADE'), nullable=False)
+    visit_type = db.Column(db.String(100))
+    tests_done = db.Column(db.Text)
+    diagnosis = db.Column(db.Text)
+    prescription = db.Column(db.Text)
+    notes = db.Column(db.Text)
+    followup_required = db.Column(db.String(5))
+
+    __table_args__ = (
+        db.Index('ix_treatments_archive_appointment_id', 'appointment_id'),
+    )
+
+    def __repr__(self):
+        return f"<ArchivedTreatment for Appointment {self.appointment_id}>"
+
+
+@db.event.listens_for(Appointment, 'before_insert')
+@db.event.listens_for(Appointment, 'before_update')
+def _set_appointment_times(mapper, connection, target):
+    target.start_at, target.end_at = slot_bounds(target.date, target.time)
+
+
+@db.event.listens_for(Availability, 'before_insert')
+@db.event.listens_for(Availability, 'before_update')
+def _set_availability_times(mapper, connection, target):
+    target.start_at, target.end_at = slot_bounds(target.date, target.time_slot)
+
@@ -0,0 +1,97 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from sqlalchemy import or_
+from models import db, Availability
+from schedule import load_weeks
+from timeslots import slot_end, slot_for_label, window_bounds
+
+MAX_SEARCH_DAYS = 90
+MAX_OPENINGS = 50
+
+Opening = namedtuple('Opening', 'doctor_id date time_slot start_at end_at avail_id')
+
+
+def _order(opening):
+    return opening.start_at, opening.end_at, opening.doctor_id
+
+
+def search_doctors(directory, department_id=None, specialization=None):
+    """Active doctors of a department and/or specialization, from the cached directory."""
+    if department_id is not None:
+        doctors = directory.doctors_by_department.get(department_id, [])
+    else:
+        doctors = list(directory.doctors.values())
+    if specialization:
+        wanted = specialization.strip().lower()
+        doctors = [d for d in doctors if d.specialization.lower() == wanted]
+    return [d for d in doctors if d.user.active]
+
+
+def earliest_openings(doctor_ids, first_day, days, limit, now=None):
+    """
+    The `limit` earliest free slots of these doctors in the `days` days
+    from `first_day`, in start order. Stored slots come from the
+    (doctor_id, start_at) index. When no doctor has a weekly schedule
+    that is a single ordered, limited query; otherwise the stored
+    bookings and overrides mask the schedule slots and days are expanded
+    in order until `limit` openings are found. avail_id is None for
+    schedule slots, which are booked by date and label.
+    """
+    now = now or datetime.now()
+    if not doctor_ids or limit < 1:
+        return []
+
+    weeks = load_weeks(doctor_ids)
+    scheduled = [doctor_id for doctor_id in doctor_ids if weeks[doctor_id]]
+
+    window_start, window_end = window_bounds(first_day, days)
+    stmt = db.select(
+        Availability.id, Availability.doctor_id, Availability.date, Availability.time_slot,
+        Availability.status, Availability.start_at, Availability.end_at
+    ).where(
+        Availability.doctor_id.in_(doctor_ids),
+        Availability.start_at >= window_start,
+        Availability.start_at < window_end,
+        Availability.end_at > now
+    )
+
+    if not scheduled:
+        rows = db.session.execute(
+            stmt.where(Availability.status == 'Available')
+            .order_by(Availability.start_at, Availability.end_at, Availability.doctor_id)
+            .limit(limit)
+        )
+        return [Opening(r.doctor_id, r.date, r.time_slot, r.start_at, r.end_at, r.id) for r in rows]
+
+    free = {}
+    taken = set()
+    rows = db.session.execute(stmt.where(or_(
+        Availability.status == 'Available',
+        Availability.doctor_id.in_(scheduled)
+    )))
+    for r in rows:
+        taken.add((r.doctor_id, r.date, r.time_slot))
+        if r.status == 'Available':
+            free.setdefault(r.start_at.date(), []).append(
+                Opening(r.doctor_id, r.date, r.time_slot, r.start_at, r.end_at, r.id)
+            )
+
+    openings = []
+    for i in range(days):
+        day = first_day + timedelta(days=i)
+        key = day.isoformat()
+        found = free.get(day, [])
+        for doctor_id in scheduled:
+            for label in weeks[doctor_id].get(day.weekday(), ()):
+                if (doctor_id, key, label) in taken:
+                    continue
+                slot = slot_for_label(label)
+                end_at = slot_end(day, slot)
+                if end_at > now:
+                    start_at = datetime.combine(day, time(slot['start_hour'], slot['start_min']))
+                    found.append(Opening(doctor_id, key, label, start_at, end_at, None))
+        # Every later day starts after this one, so stop once enough are found.
+        openings += sorted(found, key=_order)
+        if len(openings) >= limit:
+            break
+    return openings[:limit]
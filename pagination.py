@@ -0,0 +1,40 @@
+from sqlalchemy import tuple_
+
+
+def encode_cursor(values):
+    return '|'.join(str(v) for v in values)
+
+
+def decode_cursor(cursor, types):
+    if not cursor:
+        return None
+    parts = cursor.split('|')
+    if len(parts) != len(types):
+        return None
+    try:
+        return tuple(t(p) for t, p in zip(types, parts))
+    except ValueError:
+        return None
+
+
+def keyset_page(query, columns, after, per_page, key_of, descending=False):
+    """
+    Return (items, next_cursor) for one page of `query` ordered by `columns`.
+    `after` is the decoded cursor of the last row on the previous page and
+    `key_of(row)` returns the values of `columns` for a row. The last column
+    must be unique so that the ordering is total.
+    """
+    key = tuple_(*columns) if len(columns) > 1 else columns[0]
+
+    if after is not None:
+        bound = tuple_(*after) if len(columns) > 1 else after[0]
+        query = query.filter(key < bound if descending else key > bound)
+
+    order = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(key_of(rows[-1]))
+    return rows, next_cursor
@@ -0,0 +1,130 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from flask import current_app, g, request
+from flask_login import current_user
+
+PROFILE_FILE = re.compile(r'^(\d{8}-\d{6}-\d{6})-([\w.]+)-(\d+)ms\.prof$')
+
+# cProfile hooks are process-wide on newer Pythons, so one request at a time.
+_profiling = threading.Lock()
+
+
+def profile_dir():
+    return current_app.config.get('PROFILE_DIR') or os.path.join(current_app.instance_path, 'profiles')
+
+
+def _wants_profile():
+    config = current_app.config
+    if not config.get('PROFILING_ENABLED') or request.endpoint == 'static':
+        return False
+    if request.headers.get(config['PROFILE_HEADER']):
+        return current_user.is_authenticated and current_user.role == 'admin'
+    rate = config.get('PROFILE_SAMPLE_RATE') or 0
+    return rate > 0 and random.random() < rate
+
+
+def _start_profile():
+    if not _wants_profile() or not _profiling.acquire(blocking=False):
+        return
+    g.profile = cProfile.Profile()
+    g.profile_started = time.perf_counter()
+    g.profile.enable()
+
+
+def _stop_profile(response):
+    profile = g.pop('profile', None)
+    if profile is None:
+        return response
+    profile.disable()
+    try:
+        name = save_profile(profile, request.endpoint, time.perf_counter() - g.profile_started)
+    except OSError:
+        current_app.logger.exception("Could not save the request profile")
+        name = None
+    finally:
+        _profiling.release()
+    if name and current_user.is_authenticated and current_user.role == 'admin':
+        response.headers['X-Profile-Id'] = name
+    return response
+
+
+def _abandon_profile(exc):
+    # after_request never ran (e.g. an error escaped); don't keep the lock.
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profile.disable()
+        _profiling.release()
+
+
+def save_profile(profile, endpoint, elapsed):
+    """Write the pstats dump and drop the oldest files beyond PROFILE_KEEP."""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = f"{datetime.now():%Y%m%d-%H%M%S-%f}-{endpoint or 'unmatched'}-{elapsed * 1000:.0f}ms.prof"
+    profile.dump_stats(os.path.join(directory, name))
+
+    keep = current_app.config.get('PROFILE_KEEP', 200)
+    for old in list_profiles()[keep:]:
+        try:
+            os.remove(os.path.join(directory, old['name']))
+        except OSError:
+            pass
+    return name
+
+
+def list_profiles():
+    """Saved profiles, newest first, described from their file names."""
+    directory = profile_dir()
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for name in names:
+        match = PROFILE_FILE.match(name)
+        if not match:
+            continue
+        profiles.append({
+            'name': name,
+            'taken_at': datetime.strptime(match.group(1), '%Y%m%d-%H%M%S-%f'),
+            'endpoint': match.group(2),
+            'duration_ms': int(match.group(3)),
+            'size': os.path.getsize(os.path.join(directory, name)),
+        })
+    profiles.sort(key=lambda p: p['taken_at'], reverse=True)
+    return profiles
+
+
+def is_profile_name(name):
+    return bool(PROFILE_FILE.match(name))
+
+
+def profile_report(name, limit=40):
+    """The top `limit` functions of a saved profile by cumulative time, as text."""
+    out = io.StringIO()
+    stats = pstats.Stats(os.path.join(profile_dir(), name), stream=out)
+    stats.strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def init_profiler(app):
+    """
+    Opt-in request profiling: with PROFILING_ENABLED, an admin request
+    carrying PROFILE_HEADER, or a PROFILE_SAMPLE_RATE share of all
+    requests, runs under cProfile and is saved to PROFILE_DIR.
+    """
+    app.config.setdefault('PROFILING_ENABLED', False)
+    app.config.setdefault('PROFILE_HEADER', 'X-Profile')
+    app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILE_KEEP', 200)
+    app.before_request(_start_profile)
+    app.after_request(_stop_profile)
+    app.teardown_request(_abandon_profile)
@@ -1,8 +1,21 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, make_response
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app, Response, stream_with_context, abort, send_from_directory
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from models import db, User, Doctor, Patient, Appointment, Department, Treatment
-from datetime import date
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import joinedload, contains_eager, aliased
+from models import (
+    db, User, Doctor, Patient, Appointment, Department, Treatment, Availability,
+    ArchivedAppointment, ArchivedTreatment, ScheduleTemplate
+)
+from pagination import keyset_page, decode_cursor
+from stats import hospital_stats, discard_appointments
+from directory import invalidate_directory
+from availability import release_patient_slots
+from user_cache import invalidate_user
+from export import EXPORT_FORMATS, export_statement, export_rows, export_lines
+from history import history_page, UNDATED
+from profiler import list_profiles, is_profile_name, profile_dir, profile_report
+from datetime import date, datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -20,38 +33,277 @@ DEPARTMENTS = [
 ]
 
 
+APPOINTMENT_STATUSES = ['Booked', 'Completed', 'Cancelled']
+
+
+def _page_size():
+    return current_app.config.get('ADMIN_PAGE_SIZE', 25)
+
+
+def _doctor_filters(args):
+    return {
+        'doctor_q': args.get('doctor_q', '').strip(),
+        'doctor_status': args.get('doctor_status', ''),
+        'doctor_department': args.get('doctor_department', type=int),
+    }
+
+
+def _patient_filters(args):
+    return {
+        'patient_q': args.get('patient_q', '').strip(),
+        'patient_status': args.get('patient_status', ''),
+    }
+
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def _appointment_filters(args):
+    filters = {
+        'appt_q': args.get('appt_q', '').strip(),
+        'appt_status': args.get('appt_status', ''),
+        'appt_from': args.get('appt_from', '').strip(),
+        'appt_to': args.get('appt_to', '').strip(),
+        'appt_department': args.get('appt_department', type=int),
+    }
+    for key in ('appt_from', 'appt_to'):
+        if filters[key] and _parse_day(filters[key]) is None:
+            filters[key] = ''
+    return filters
+
+
+def _filter_active(query, status):
+    if status == 'active':
+        return query.filter(User.active == True)
+    if status == 'inactive':
+        return query.filter(User.active == False)
+    return query
+
+
+def doctor_page(filters, after=None):
+    query = Doctor.query.join(User).options(contains_eager(Doctor.user))
+    if filters['doctor_q']:
+        query = query.filter(User.name.ilike(f"%{filters['doctor_q']}%"))
+    query = _filter_active(query, filters['doctor_status'])
+    if filters['doctor_department']:
+        query = query.filter(Doctor.department_id == filters['doctor_department'])
+
+    return keyset_page(
+        query, [Doctor.id], decode_cursor(after, [int]), _page_size(),
+        key_of=lambda d: (d.id,)
+    )
+
+
+def patient_page(filters, after=None):
+    query = Patient.query.join(User).options(contains_eager(Patient.user))
+    if filters['patient_q']:
+        query = query.filter(User.name.ilike(f"%{filters['patient_q']}%"))
+    query = _filter_active(query, filters['patient_status'])
+
+    return keyset_page(
+        query, [Patient.id], decode_cursor(after, [int]), _page_size(),
+        key_of=lambda p: (p.id,)
+    )
+
+
+def appointment_page(filters, after=None):
+    query = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.user)
+    )
+
+    if filters['appt_status']:
+        query = query.filter(Appointment.status == filters['appt_status'])
+    else:
+        query = query.filter(Appointment.status != "Cancelled")
+    if filters['appt_from']:
+        query = query.filter(Appointment.start_at >= _parse_day(filters['appt_from']))
+    if filters['appt_to']:
+        query = query.filter(Appointment.start_at < _parse_day(filters['appt_to']) + timedelta(days=1))
+    if filters['appt_department']:
+        query = query.filter(Appointment.doctor.has(Doctor.department_id == filters['appt_department']))
+    if filters['appt_q']:
+        patient_user = aliased(User)
+        doctor_user = aliased(User)
+        pattern = f"%{filters['appt_q']}%"
+        query = query.join(Patient, Appointment.patient_id == Patient.id) \
+            .join(patient_user, Patient.user_id == patient_user.id) \
+            .join(Doctor, Appointment.doctor_id == Doctor.id) \
+            .join(doctor_user, Doctor.user_id == doctor_user.id) \
+            .filter(or_(patient_user.name.ilike(pattern), doctor_user.name.ilike(pattern)))
+
+    # Same key as the appointment filters above, so pages follow start_at.
+    started = func.coalesce(Appointment.start_at, UNDATED)
+    return keyset_page(
+        query, [started, Appointment.id], decode_cursor(after, [datetime.fromisoformat, int]), _page_size(),
+        key_of=lambda a: (a.start_at or UNDATED, a.id)
+    )
+
+
+def _delete_appointments(**match):
+    """
+    Bulk delete the appointments matching `match` (e.g. doctor_id=3), live
+    and archived, and their treatments with subquery-based DELETEs, after
+    taking them out of the dashboard counters. The ON DELETE CASCADE rules
+    would remove them with their parent too; deleting them up front keeps
+    the stats in step.
+    """
+    for appointment, treatment in ((Appointment, Treatment), (ArchivedAppointment, ArchivedTreatment)):
+        appointments = appointment.__table__
+        condition = and_(*[appointments.c[name] == value for name, value in match.items()])
+        discard_appointments(db.session.connection(), condition, appointments)
+        treatment.query.filter(
+            treatment.appointment_id.in_(db.select(appointments.c.id).where(condition))
+        ).delete(synchronize_session=False)
+        appointment.query.filter(condition).delete(synchronize_session=False)
+
+
 @admin_bp.route('/dashboard')
 @login_required
 def admin_dashboard():
     if current_user.role != 'admin':
         return "Access denied", 403
 
-    total_doctors = Doctor.query.count()
-    total_patients = Patient.query.count()
-    total_appointments = Appointment.query.filter(Appointment.status != "Cancelled").count()
+    stats = hospital_stats()
+
+    doctor_filters = _doctor_filters(request.args)
+    patient_filters = _patient_filters(request.args)
+    appointment_filters = _appointment_filters(request.args)
 
-    doctors = Doctor.query.all()
-    patients = Patient.query.all()
-    appointments = Appointment.query.filter(Appointment.status != "Cancelled").all()
+    doctors, doctors_next = doctor_page(doctor_filters)
+    patients, patients_next = patient_page(patient_filters)
+    appointments, appointments_next = appointment_page(appointment_filters)
 
-    response = make_response(render_template(
+    return render_template(
         'dashboard_admin.html',
         user=current_user,
-        total_doctors=total_doctors,
-        total_patients=total_patients,
-        total_appointments=total_appointments,
+        total_doctors=stats.doctors,
+        total_patients=stats.patients,
+        total_appointments=stats.appointments,
+        departments=Department.query.order_by(Department.name).all(),
+        statuses=APPOINTMENT_STATUSES,
+        doctor_filters=doctor_filters,
+        patient_filters=patient_filters,
+        appointment_filters=appointment_filters,
         doctors=doctors,
+        doctors_next=doctors_next,
         patients=patients,
-        appointments=appointments
-    ))
+        patients_next=patients_next,
+        appointments=appointments,
+        appointments_next=appointments_next,
+        start=0
+    )
+
+
+@admin_bp.route('/dashboard/doctors')
+@login_required
+def dashboard_doctors():
+    if current_user.role != 'admin':
+        return "Access denied", 403
+
+    doctors, doctors_next = doctor_page(_doctor_filters(request.args), request.args.get('after'))
+    return render_template(
+        'admin_doctor_rows.html',
+        doctors=doctors,
+        doctors_next=doctors_next,
+        doctor_filters=_doctor_filters(request.args)
+    )
 
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
 
-    return response
+@admin_bp.route('/dashboard/patients')
+@login_required
+def dashboard_patients():
+    if current_user.role != 'admin':
+        return "Access denied", 403
+
+    patients, patients_next = patient_page(_patient_filters(request.args), request.args.get('after'))
+    return render_template(
+        'admin_patient_rows.html',
+        patients=patients,
+        patients_next=patients_next,
+        patient_filters=_patient_filters(request.args)
+    )
 
 
+@admin_bp.route('/dashboard/appointments')
+@login_required
+def dashboard_appointments():
+    if current_user.role != 'admin':
+        return "Access denied", 403
+
+    appointments, appointments_next = appointment_page(_appointment_filters(request.args), request.args.get('after'))
+    return render_template(
+        'admin_appointment_rows.html',
+        appointments=appointments,
+        appointments_next=appointments_next,
+        appointment_filters=_appointment_filters(request.args),
+        start=request.args.get('start', 0, type=int)
+    )
+
+
+@admin_bp.route('/export/appointments.<fmt>')
+@login_required
+def export_appointments(fmt):
+    if current_user.role != 'admin':
+        return "Access denied", 403
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+
+    filters = _appointment_filters(request.args)
+    stmt = export_statement(
+        date_from=_parse_day(filters['appt_from']) if filters['appt_from'] else None,
+        date_to=_parse_day(filters['appt_to']) if filters['appt_to'] else None,
+        department_id=filters['appt_department'],
+        status=filters['appt_status'],
+        q=filters['appt_q']
+    )
+
+    filename = f"appointments-{date.today().isoformat()}.{fmt}"
+    return Response(
+        stream_with_context(export_lines(fmt, export_rows(stmt))),
+        mimetype='text/csv' if fmt == 'csv' else 'application/x-ndjson',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+
+@admin_bp.route('/profiles')
+@login_required
+def profiles():
+    if current_user.role != 'admin':
+        return "Access denied", 403
+
+    return render_template('admin_profiles.html', profiles=list_profiles())
+
+
+@admin_bp.route('/profiles/<name>')
+@login_required
+def download_profile(name):
+    if current_user.role != 'admin':
+        return "Access denied", 403
+    if not is_profile_name(name):
+        abort(404)
+
+    return send_from_directory(profile_dir(), name, as_attachment=True)
+
+
+@admin_bp.route('/profiles/<name>/report')
+@login_required
+def profile_report_view(name):
+    if current_user.role != 'admin':
+        return "Access denied", 403
+    if not is_profile_name(name):
+        abort(404)
+
+    try:
+        report = profile_report(name)
+    except FileNotFoundError:
+        abort(404)
+    return Response(report, mimetype='text/plain')
+
 
 @admin_bp.route('/edit_patient/<int:id>', methods=['GET', 'POST'])
 @login_required
@@ -71,6 +323,7 @@ def edit_patient(id):
         patient.address = request.form['address']
 
         db.session.commit()
+        invalidate_user(user.id)
         flash("Patient details updated.")
         return redirect(url_for('admin.admin_dashboard'))
 
@@ -133,6 +386,8 @@ def edit_doctor(id):
         doctor.department_id = dept.id
 
         db.session.commit()
+        invalidate_directory()
+        invalidate_user(user.id)
         flash("Doctor details updated.")
         return redirect(url_for('admin.admin_dashboard'))
 
@@ -189,6 +444,7 @@ def add_doctor():
         db.session.add(doctor)
         db.session.commit()
 
+        invalidate_directory()
         flash("Doctor added.")
         return redirect(url_for('admin.admin_dashboard'))
 
@@ -256,21 +512,18 @@ def delete_doctor(id):
         return "Access denied", 403
 
     doctor = Doctor.query.get_or_404(id)
-    user = doctor.user
+    user_id = doctor.user_id
 
-    appointments = Appointment.query.filter_by(doctor_id=id).all()
-    appt_ids = [a.id for a in appointments]
-
-    if appt_ids:
-        Treatment.query.filter(Treatment.appointment_id.in_(appt_ids)).delete(synchronize_session=False)
-
-    Appointment.query.filter_by(doctor_id=id).delete(synchronize_session=False)
+    _delete_appointments(doctor_id=id)
+    Availability.query.filter_by(doctor_id=id).delete(synchronize_session=False)
+    ScheduleTemplate.query.filter_by(doctor_id=id).delete(synchronize_session=False)
 
     db.session.delete(doctor)
-    db.session.delete(user)
-
+    db.session.delete(db.session.get(User, user_id))
     db.session.commit()
 
+    invalidate_directory()
+    invalidate_user(user_id)
     flash("Doctor deleted along with related appointments.", "success")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -283,9 +536,12 @@ def blacklist_doctor(id):
         return "Access denied", 403
 
     doctor = Doctor.query.get_or_404(id)
-    doctor.user.active = False
+    user = doctor.user
+    user.active = False
     db.session.commit()
 
+    invalidate_directory()
+    invalidate_user(user.id)
     flash("Doctor blacklisted.")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -297,9 +553,12 @@ def reactivate_doctor(id):
         return "Access denied", 403
 
     doctor = Doctor.query.get_or_404(id)
-    doctor.user.active = True
+    user = doctor.user
+    user.active = True
     db.session.commit()
 
+    invalidate_directory()
+    invalidate_user(user.id)
     flash("Doctor reactivated.")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -311,12 +570,17 @@ def delete_patient(id):
         return "Access denied", 403
 
     patient = Patient.query.get_or_404(id)
-    user = patient.user
+    user_id = patient.user_id
+
+    release_patient_slots(id)
+    _delete_appointments(patient_id=id)
+
     db.session.delete(patient)
-    db.session.delete(user)
+    db.session.delete(db.session.get(User, user_id))
     db.session.commit()
 
-    flash("Patient deleted.")
+    invalidate_user(user_id)
+    flash("Patient deleted along with related appointments.")
     return redirect(url_for('admin.admin_dashboard'))
 
 
@@ -327,9 +591,11 @@ def blacklist_patient(id):
         return "Access denied", 403
 
     patient = Patient.query.get_or_404(id)
-    patient.user.active = False
+    user = patient.user
+    user.active = False
     db.session.commit()
 
+    invalidate_user(user.id)
     flash("Patient blacklisted.")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -341,9 +607,11 @@ def reactivate_patient(id):
         return "Access denied", 403
 
     patient = Patient.query.get_or_404(id)
-    patient.user.active = True
+    user = patient.user
+    user.active = True
     db.session.commit()
 
+    invalidate_user(user.id)
     flash("Patient reactivated.")
     return redirect(url_for('admin.admin_dashboard'))
 
@@ -355,6 +623,28 @@ def patient_history(patient_id):
         return "Access denied", 403
 
     patient = Patient.query.get_or_404(patient_id)
-    appointments = Appointment.query.filter_by(patient_id=patient.id).all()
+    appointments, appointments_next = history_page(patient.id)
+
+    return render_template(
+        "patient_history.html",
+        patient=patient,
+        appointments=appointments,
+        appointments_next=appointments_next,
+        rows_endpoint='admin.patient_history_rows'
+    )
+
 
-    return render_template("patient_history.html", patient=patient, appointments=appointments)
+@admin_bp.route('/patient_history/<int:patient_id>/rows')
+@login_required
+def patient_history_rows(patient_id):
+    if current_user.role != 'admin':
+        return "Access denied", 403
+
+    appointments, appointments_next = history_page(patient_id, after=request.args.get('after'))
+    return render_template(
+        'patient_history_rows.html',
+        patient_id=patient_id,
+        appointments=appointments,
+        appointments_next=appointments_next,
+        rows_endpoint='admin.patient_history_rows'
+    )
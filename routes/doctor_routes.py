@@ -1,7 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, make_response, jsonify
+from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_required, current_user
-from models import db, Doctor, Appointment, Treatment, Availability, Patient
-from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from models import db, Doctor, Appointment, Treatment, Availability, Patient, ScheduleTemplate
+from timeslots import slot_bounds
+from stats import doctor_stats
+from availability import apply_slot_changes, toggle_slot, build_grid, grid_json_response, bump_availability_version
+from schedule import WEEKDAYS, SLOT_LENGTHS, overlapping_template, template_labels, weekly_schedule
+from history import history_page
+from datetime import datetime, time
 
 doctor_bp = Blueprint('doctor', __name__, url_prefix='/doctor')
 
@@ -18,26 +25,20 @@ def doctor_dashboard():
         flash('Doctor profile not found. Please contact an administrator.', 'error')
         return redirect(url_for('auth.login'))
 
-    appointments = Appointment.query.filter_by(doctor_id=doctor.id).filter(Appointment.status != "Cancelled").all()
+    appointments = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user)
+    ).filter_by(doctor_id=doctor.id).filter(Appointment.status != "Cancelled").all()
 
-    total_patients = len({appt.patient_id for appt in appointments})
-    total_appointments = len(appointments)
-    completed = sum(1 for a in appointments if a.status == "Completed")
+    stats = doctor_stats(doctor.id)
 
-    response = make_response(render_template(
+    return render_template(
         'dashboard_doctor.html',
         doctor=doctor,
         appointments=appointments,
-        total_patients=total_patients,
-        total_appointments=total_appointments,
-        completed=completed
-    ))
-
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
-
-    return response
+        total_patients=stats.patients,
+        total_appointments=stats.appointments,
+        completed=stats.completed
+    )
 
 
 
@@ -145,115 +146,131 @@ def doctor_availability():
 
     doctor = Doctor.query.filter_by(user_id=current_user.id).first()
 
-    def parse_end_datetime(date_str, time_slot_str):
-        """
-        Parse common time slot formats and return a datetime for the end time.
-        Supported examples: '10:00 AM - 12:00 PM', '10:00-12:00', '10:00 - 12:00'
-        Returns a datetime or None if parsing fails.
-        """
-        if not time_slot_str:
-            return None
-
-        parts = time_slot_str.split('-')
-        if len(parts) < 2:
-            return None
-
-        end_part = parts[-1].strip()
-
-        fmts = ['%I:%M %p', '%H:%M', '%I %p', '%H%M']
-        for fmt in fmts:
-            try:
-                t = datetime.strptime(end_part, fmt).time()
-                dt = datetime.strptime(date_str, '%Y-%m-%d')
-                return datetime.combine(dt.date(), t)
-            except Exception:
-                continue
-
-        try:
-            compact = end_part.replace(' ', '')
-            t = datetime.strptime(compact, '%I:%M%p').time()
-            dt = datetime.strptime(date_str, '%Y-%m-%d')
-            return datetime.combine(dt.date(), t)
-        except Exception:
-            return None
-
-    avail_list = Availability.query.filter_by(doctor_id=doctor.id).all()
-    now = datetime.now()
-    removed = False
-    for a in list(avail_list):
-        end_dt = parse_end_datetime(a.date, a.time_slot)
-        if end_dt and end_dt <= now:
-            db.session.delete(a)
-            removed = True
-
-    if removed:
-        db.session.commit()
-
     if request.method == 'POST':
         date = request.form['date']
         time_slot = request.form['time_slot']
         status = request.form['status']
 
-        end_dt = parse_end_datetime(date, time_slot)
+        _, end_dt = slot_bounds(date, time_slot)
         if end_dt is None:
             flash('Could not parse time slot. Use format like "10:00 AM - 12:00 PM" or "10:00-12:00".', 'error')
             return redirect(url_for('doctor.doctor_availability'))
 
-        if end_dt <= now:
+        if end_dt <= datetime.now():
             flash('Cannot add availability that ends in the past.', 'error')
             return redirect(url_for('doctor.doctor_availability'))
 
         new_avail = Availability(doctor_id=doctor.id, date=date, time_slot=time_slot, status=status)
         db.session.add(new_avail)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('That slot already exists.', 'error')
+            return redirect(url_for('doctor.doctor_availability'))
 
         flash('Availability added.', 'success')
         return redirect(url_for('doctor.doctor_availability'))
 
-    availabilities = Availability.query.filter_by(doctor_id=doctor.id).all()
-
     now_dt = datetime.now()
-    today = now_dt.date()
-    next_7 = [(today + timedelta(days=i)) for i in range(7)]
-
-    SLOTS = [
-        { 'key': 'morning', 'label': '08:00 - 12:00', 'end_hour': 12, 'end_min': 0 },
-        { 'key': 'evening', 'label': '16:00 - 21:00', 'end_hour': 21, 'end_min': 0 }
-    ]
-
-    avail_map = {}
-    for a in availabilities:
-        try:
-            ad = datetime.strptime(a.date, '%Y-%m-%d').date()
-        except Exception:
-            continue
-        avail_map.setdefault(ad.isoformat(), {})[a.time_slot] = a
-
-    disabled_map = {}
-    for d in next_7:
-        ds = d.isoformat()
-        disabled_map[ds] = {}
-        for slot in SLOTS:
-            try:
-                end_dt = datetime.combine(d, datetime.min.time()).replace(hour=slot['end_hour'], minute=slot['end_min'])
-            except Exception:
-                disabled_map[ds][slot['label']] = False
-                continue
-
-            disabled_map[ds][slot['label']] = (end_dt <= datetime.now())
+    next_7, slots, avail_map, disabled_map = build_grid(doctor.id, now_dt.date(), now=now_dt)
+    templates = ScheduleTemplate.query.filter_by(doctor_id=doctor.id).order_by(
+        ScheduleTemplate.weekday, ScheduleTemplate.start_time
+    ).all()
 
     return render_template(
         'doctor_availability.html',
         doctor=doctor,
-        availabilities=availabilities,
         next_7=next_7,
-        slots=SLOTS,
+        slots=slots,
         avail_map=avail_map,
         now=now_dt,
-        disabled_map=disabled_map
+        disabled_map=disabled_map,
+        week=weekly_schedule(doctor.id),
+        templates=templates,
+        weekdays=WEEKDAYS,
+        slot_lengths=SLOT_LENGTHS
     )
 
 
+@doctor_bp.route('/schedule', methods=['POST'])
+@login_required
+def add_schedule():
+    if current_user.role != 'doctor':
+        return "Access denied", 403
+
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    if not doctor:
+        flash('Doctor profile missing.', 'error')
+        return redirect(url_for('auth.login'))
+
+    weekdays = sorted({d for d in request.form.getlist('weekday', type=int) if 0 <= d < len(WEEKDAYS)})
+    slot_minutes = request.form.get('slot_minutes', type=int) or None
+    try:
+        start_time = time.fromisoformat(request.form.get('start_time', '')).strftime('%H:%M')
+        end_time = time.fromisoformat(request.form.get('end_time', '')).strftime('%H:%M')
+    except ValueError:
+        flash('Enter start and end times as HH:MM.', 'error')
+        return redirect(url_for('doctor.doctor_availability'))
+
+    if not weekdays:
+        flash('Pick at least one weekday.', 'error')
+        return redirect(url_for('doctor.doctor_availability'))
+    if slot_minutes is not None and slot_minutes not in SLOT_LENGTHS:
+        flash('Unsupported slot length.', 'error')
+        return redirect(url_for('doctor.doctor_availability'))
+    if start_time >= end_time or not template_labels(start_time, end_time, slot_minutes):
+        flash('The schedule must end after it starts and fit at least one slot.', 'error')
+        return redirect(url_for('doctor.doctor_availability'))
+
+    clash = overlapping_template(doctor.id, weekdays, start_time, end_time)
+    if clash:
+        flash(f'Overlaps your {WEEKDAYS[clash.weekday]} {clash.start_time}-{clash.end_time} schedule.', 'error')
+        return redirect(url_for('doctor.doctor_availability'))
+
+    db.session.execute(ScheduleTemplate.__table__.insert(), [
+        {'doctor_id': doctor.id, 'weekday': weekday, 'start_time': start_time,
+         'end_time': end_time, 'slot_minutes': slot_minutes}
+        for weekday in weekdays
+    ])
+    bump_availability_version(doctor.id)
+    db.session.commit()
+
+    flash('Weekly schedule added.', 'success')
+    return redirect(url_for('doctor.doctor_availability'))
+
+
+@doctor_bp.route('/schedule/<int:template_id>/delete', methods=['POST'])
+@login_required
+def delete_schedule(template_id):
+    if current_user.role != 'doctor':
+        return "Access denied", 403
+
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    template = ScheduleTemplate.query.get_or_404(template_id)
+    if not doctor or template.doctor_id != doctor.id:
+        return "Unauthorized", 403
+
+    db.session.delete(template)
+    db.session.commit()
+
+    flash('Weekly schedule removed. Booked slots are kept.', 'success')
+    return redirect(url_for('doctor.doctor_availability'))
+
+
+@doctor_bp.route('/availability.json')
+@login_required
+def doctor_availability_json():
+    if current_user.role != 'doctor':
+        return "Access denied", 403
+
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    if not doctor:
+        return "Doctor profile missing", 404
+
+    return grid_json_response(doctor.id)
+
+
 @doctor_bp.route('/toggle_availability/<int:avail_id>')
 @login_required
 def toggle_availability(avail_id):
@@ -289,17 +306,12 @@ def toggle_availability_post():
         flash('Doctor profile missing.', 'error')
         return redirect(url_for('auth.login'))
 
-    avail = Availability.query.filter_by(doctor_id=doctor.id, date=date, time_slot=time_slot).first()
-    if avail:
-        avail.status = 'Unavailable' if avail.status == 'Available' else 'Available'
+    if toggle_slot(doctor.id, date, time_slot):
         db.session.commit()
         flash('Availability updated.', 'success')
-        return redirect(url_for('doctor.doctor_availability'))
-
-    new_avail = Availability(doctor_id=doctor.id, date=date, time_slot=time_slot, status='Available')
-    db.session.add(new_avail)
-    db.session.commit()
-    flash('Availability added.', 'success')
+    else:
+        db.session.rollback()
+        flash('Booked slots cannot be changed.', 'error')
     return redirect(url_for('doctor.doctor_availability'))
 
 
@@ -315,40 +327,18 @@ def save_availability():
         flash('Doctor profile missing.', 'error')
         return redirect(url_for('auth.login'))
 
-    changes_made = 0
+    changes = {}
     for key, value in request.form.items():
         if key.startswith('change_'):
             change_key = key[7:]  
             try:
                 date_str, slot_label = change_key.rsplit('|', 1)
-            except:
+            except ValueError:
                 continue
-            
-            status = value 
-            
-            existing = Availability.query.filter_by(
-                doctor_id=doctor.id,
-                date=date_str,
-                time_slot=slot_label
-            ).first()
-            
-            if status == 'none':
-                if existing:
-                    db.session.delete(existing)
-                    changes_made += 1
-            else:
-                if existing:
-                    existing.status = status
-                else:
-                    new_avail = Availability(
-                        doctor_id=doctor.id,
-                        date=date_str,
-                        time_slot=slot_label,
-                        status=status
-                    )
-                    db.session.add(new_avail)
-                changes_made += 1
-    
+            if value in ('Available', 'Unavailable', 'none'):
+                changes[(date_str, slot_label)] = value
+
+    changes_made = apply_slot_changes(doctor.id, changes)
     db.session.commit()
     
     if changes_made > 0:
@@ -370,11 +360,35 @@ def patient_history(patient_id):
         flash('Doctor profile missing.', 'error')
         return redirect(url_for('auth.login'))
 
-    appointments = Appointment.query.filter_by(patient_id=patient.id, doctor_id=doctor.id).all()
+    appointments, appointments_next = history_page(patient.id, doctor_id=doctor.id)
 
     return render_template(
         'patient_history.html',
         patient=patient,
-        appointments=appointments
+        appointments=appointments,
+        appointments_next=appointments_next,
+        rows_endpoint='doctor.patient_history_rows'
+    )
+
+
+@doctor_bp.route('/patient_history/<int:patient_id>/rows')
+@login_required
+def patient_history_rows(patient_id):
+    if current_user.role != 'doctor':
+        return "Access denied", 403
+
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+    if not doctor:
+        return "Doctor profile missing", 404
+
+    appointments, appointments_next = history_page(
+        patient_id, doctor_id=doctor.id, after=request.args.get('after')
+    )
+    return render_template(
+        'patient_history_rows.html',
+        patient_id=patient_id,
+        appointments=appointments,
+        appointments_next=appointments_next,
+        rows_endpoint='doctor.patient_history_rows'
     )
 
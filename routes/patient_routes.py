@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, redirect, url_for, request, flash, make_response
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, jsonify
 from flask_login import login_required, current_user
-from models import db, User, Patient, Doctor, Appointment, Department, Availability
-from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload
+from models import db, Patient, Doctor, Appointment, ArchivedAppointment
+from booking import book_slot
+from metrics import CANCELLATIONS
+from availability import build_grid, grid_json_response, release_slot
+from directory import get_directory
+from openings import MAX_OPENINGS, MAX_SEARCH_DAYS, earliest_openings, search_doctors
+from user_cache import invalidate_user
+from cache_policy import conditional, make_etag
+from datetime import date, datetime
 
 patient_bp = Blueprint('patient', __name__, url_prefix='/patient')
 
@@ -16,15 +24,16 @@ def patient_dashboard():
         patient = Patient(user_id=current_user.id)
         db.session.add(patient)
         db.session.commit()
-    departments = Department.query.all()
-    doctors = Doctor.query.join(User).filter(User.active == True).all()
-    appointments = Appointment.query.filter_by(patient_id=patient.id).all()
+    directory = get_directory()
+    appointments = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user)
+    ).filter_by(patient_id=patient.id).all()
 
     return render_template(
         'dashboard_patient.html',
         patient=patient,
-        doctors=doctors,
-        departments=departments,
+        doctors=directory.active_doctors,
+        departments=directory.departments,
         appointments=appointments
     )
 
@@ -42,14 +51,16 @@ def edit_profile():
         db.session.commit()
 
     if request.method == 'POST':
-        current_user.name = request.form['name']
-        current_user.email = request.form['email']
+        user = patient.user
+        user.name = request.form['name']
+        user.email = request.form['email']
         patient.age = request.form['age']
         patient.gender = request.form['gender']
         patient.phone = request.form['phone']
         patient.address = request.form['address']
 
         db.session.commit()
+        invalidate_user(user.id)
         flash("Profile updated successfully!", "success")
         return redirect(url_for('patient.patient_dashboard'))
 
@@ -62,8 +73,16 @@ def department_details(dept_id):
     if current_user.role != 'patient':
         return "Access denied", 403
 
-    department = Department.query.get_or_404(dept_id)
-    doctors = Doctor.query.filter_by(department_id=dept_id).all()
+    directory = get_directory()
+    department = directory.departments_by_id.get(dept_id)
+    if department is None:
+        abort(404)
+
+    not_modified = conditional(make_etag('department', dept_id, directory.version), directory.changed_at)
+    if not_modified:
+        return not_modified
+
+    doctors = directory.doctors_by_department.get(dept_id, [])
 
     return render_template(
         'department_details.html',
@@ -78,8 +97,16 @@ def doctor_details(doctor_id):
     if current_user.role != 'patient':
         return "Access denied", 403
 
-    doctor = Doctor.query.get_or_404(doctor_id)
-    department = Department.query.get(doctor.department_id)
+    directory = get_directory()
+    doctor = directory.doctors.get(doctor_id)
+    if doctor is None:
+        abort(404)
+
+    not_modified = conditional(make_etag('doctor', doctor_id, directory.version), directory.changed_at)
+    if not_modified:
+        return not_modified
+
+    department = directory.departments_by_id.get(doctor.department_id)
 
     return render_template(
         'doctor_details.html',
@@ -101,37 +128,6 @@ def doctor_availability_for_patient(doctor_id):
         flash('Doctor not found.', 'error')
         return redirect(url_for('patient.patient_dashboard'))
 
-    availabilities = Availability.query.filter_by(doctor_id=doctor.id).all()
-
-    today = datetime.now().date()
-    next_7 = [(today + timedelta(days=i)) for i in range(7)]
-    
-    SLOTS = [
-        { 'key': 'morning', 'label': '08:00 - 12:00', 'end_hour': 12, 'end_min': 0 },
-        { 'key': 'evening', 'label': '16:00 - 21:00', 'end_hour': 21, 'end_min': 0 }
-    ]
-
-    avail_map = {}
-    for a in availabilities:
-        try:
-            ad = datetime.strptime(a.date, '%Y-%m-%d').date()
-        except Exception:
-            continue
-        avail_map.setdefault(ad.isoformat(), {})[a.time_slot] = a
-
-    now_dt = datetime.now()
-    disabled_map = {}
-    for d in next_7:
-        ds = d.isoformat()
-        disabled_map[ds] = {}
-        for slot in SLOTS:
-            try:
-                end_dt = datetime.combine(d, datetime.min.time()).replace(hour=slot['end_hour'], minute=slot['end_min'])
-            except Exception:
-                disabled_map[ds][slot['label']] = False
-                continue
-            disabled_map[ds][slot['label']] = (end_dt <= now_dt)
-
     patient = Patient.query.filter_by(user_id=current_user.id).first()
     if not patient:
         patient = Patient(user_id=current_user.id)
@@ -139,41 +135,108 @@ def doctor_availability_for_patient(doctor_id):
         db.session.commit()
 
     if request.method == 'POST':
-        avail_id = request.form.get('avail_id')
-        if not avail_id:
+        avail_id = request.form.get('avail_id', type=int)
+        slot_date = request.form.get('date')
+        time_slot = request.form.get('time_slot')
+        if not avail_id and not (slot_date and time_slot):
             flash('No slot selected.', 'error')
             return redirect(url_for('patient.doctor_availability_for_patient', doctor_id=doctor.id))
 
-        slot = Availability.query.get(avail_id)
-        if not slot or slot.status != 'Available':
+        if not book_slot(patient.id, doctor.id, avail_id, slot_date, time_slot):
             flash('Slot is no longer available.', 'error')
             return redirect(url_for('patient.doctor_availability_for_patient', doctor_id=doctor.id))
 
-        new_appointment = Appointment(
-            patient_id=patient.id,
-            doctor_id=doctor.id,
-            date=slot.date,
-            time=slot.time_slot,
-            status='Booked'
-        )
-        db.session.add(new_appointment)
-        slot.status = 'Booked'
-        db.session.commit()
-
         flash('Appointment booked successfully!', 'success')
         return redirect(url_for('patient.patient_dashboard'))
 
+    next_7, slots, avail_map, disabled_map = build_grid(doctor.id, datetime.now().date())
+
     return render_template(
         'doctor_availability_for_patient.html',
         doctor=doctor,
-        availabilities=availabilities,
         next_7=next_7,
-        slots=SLOTS,
+        slots=slots,
         avail_map=avail_map,
         disabled_map=disabled_map
     )
 
 
+@patient_bp.route('/doctor/<int:doctor_id>/availability.json')
+@login_required
+def doctor_availability_json(doctor_id):
+    if current_user.role != 'patient':
+        return "Access denied", 403
+
+    return grid_json_response(doctor_id)
+
+
+def _openings_search():
+    """
+    Run the earliest-openings search for ?department_id=&specialization=
+    &start=YYYY-MM-DD&days=N&limit=N. Returns (department, doctors by id,
+    openings).
+    """
+    directory = get_directory()
+    department_id = request.args.get('department_id', type=int)
+    department = None
+    if department_id is not None:
+        department = directory.departments_by_id.get(department_id)
+        if department is None:
+            abort(404)
+    specialization = request.args.get('specialization', '').strip()
+    if department is None and not specialization:
+        abort(400)
+
+    now = datetime.now()
+    try:
+        first_day = max(date.fromisoformat(request.args.get('start', '')), now.date())
+    except ValueError:
+        first_day = now.date()
+    days = min(max(request.args.get('days', 14, type=int), 1), MAX_SEARCH_DAYS)
+    limit = min(max(request.args.get('limit', 10, type=int), 1), MAX_OPENINGS)
+
+    doctors = {d.id: d for d in search_doctors(directory, department_id, specialization)}
+    openings = earliest_openings(list(doctors), first_day, days, limit, now)
+    return department, doctors, openings
+
+
+@patient_bp.route('/openings')
+@login_required
+def openings():
+    if current_user.role != 'patient':
+        return "Access denied", 403
+
+    department, doctors, found = _openings_search()
+    return render_template(
+        'openings.html',
+        department=department,
+        specialization=request.args.get('specialization', '').strip(),
+        doctors=doctors,
+        openings=found
+    )
+
+
+@patient_bp.route('/openings.json')
+@login_required
+def openings_json():
+    if current_user.role != 'patient':
+        return "Access denied", 403
+
+    _, doctors, found = _openings_search()
+    return jsonify({'openings': [
+        {
+            'doctor_id': o.doctor_id,
+            'doctor_name': doctors[o.doctor_id].user.name,
+            'date': o.date,
+            'time_slot': o.time_slot,
+            'start_at': o.start_at.isoformat(),
+            'end_at': o.end_at.isoformat(),
+            'avail_id': o.avail_id,
+        }
+        for o in found
+    ]})
+
+
 @patient_bp.route('/appointments')
 @login_required
 def patient_appointments():
@@ -185,7 +248,14 @@ def patient_appointments():
         flash('Patient profile missing.', 'error')
         return redirect(url_for('patient.patient_dashboard'))
 
-    appointments = Appointment.query.filter_by(patient_id=patient.id).all()
+    appointments = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.department)
+    ).filter_by(patient_id=patient.id).all()
+    appointments += ArchivedAppointment.query.options(
+        joinedload(ArchivedAppointment.doctor).joinedload(Doctor.user),
+        joinedload(ArchivedAppointment.doctor).joinedload(Doctor.department)
+    ).filter_by(patient_id=patient.id).order_by(ArchivedAppointment.start_at).all()
 
     return render_template('patient_appointments.html', patient=patient, appointments=appointments)
 
@@ -206,16 +276,15 @@ def cancel_appointment(appt_id):
     if appointment.patient_id != patient.id:
         return "Unauthorized", 403
 
-    availability = Availability.query.filter_by(
-        doctor_id=appointment.doctor_id,
-        date=appointment.date,
-        time_slot=appointment.time
-    ).first()
-    if availability:
-        availability.status = 'Available'
+    # A cancelled or completed visit no longer holds its slot, which may have been booked again since.
+    if appointment.status != 'Booked':
+        flash(f"This appointment is already {appointment.status.lower()}.", "info")
+        return redirect(url_for('patient.patient_dashboard'))
 
+    release_slot(appointment.doctor_id, appointment.date, appointment.time)
     appointment.status = "Cancelled"
     db.session.commit()
+    CANCELLATIONS.inc()
 
     flash("Appointment cancelled.", "info")
     return redirect(url_for('patient.patient_dashboard'))
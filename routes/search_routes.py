@@ -0,0 +1,43 @@
+from flask import Blueprint, render_template, redirect, url_for, request, flash, current_app
+from flask_login import login_required, current_user
+from models import Doctor, Patient
+from pagination import encode_cursor, decode_cursor
+from search import search_treatments, highlight
+
+search_bp = Blueprint('search', __name__, url_prefix='/search')
+search_bp.add_app_template_filter(highlight, 'highlight')
+
+
+@search_bp.route('/treatments')
+@login_required
+def search_treatments_view():
+    scope = {}
+    if current_user.role == 'doctor':
+        doctor = Doctor.query.filter_by(user_id=current_user.id).first()
+        if not doctor:
+            flash('Doctor profile missing.', 'error')
+            return redirect(url_for('auth.login'))
+        scope['doctor_id'] = doctor.id
+    elif current_user.role == 'patient':
+        patient = Patient.query.filter_by(user_id=current_user.id).first()
+        if not patient:
+            flash('Patient profile missing.', 'error')
+            return redirect(url_for('patient.patient_dashboard'))
+        scope['patient_id'] = patient.id
+    elif current_user.role != 'admin':
+        return "Access denied", 403
+
+    q = request.args.get('q', '').strip()
+    hits, next_after = search_treatments(
+        q,
+        after=decode_cursor(request.args.get('after'), [float, int]),
+        per_page=current_app.config.get('SEARCH_PAGE_SIZE', 20),
+        **scope
+    )
+
+    return render_template(
+        'search_treatments.html',
+        q=q,
+        hits=hits,
+        next_cursor=encode_cursor(next_after) if next_after else None
+    )
@@ -0,0 +1,87 @@
+import threading
+from datetime import date, datetime, time, timedelta
+from models import db, Doctor, ScheduleTemplate
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+SLOT_LENGTHS = (15, 20, 30, 45, 60)
+CACHE_SIZE = 1024
+
+# doctor_id -> (availability_version, {weekday: (label, ...)})
+_weeks = {}
+_weeks_lock = threading.Lock()
+
+
+def template_labels(start_time, end_time, slot_minutes):
+    """
+    Slot labels such as '08:00 - 08:30' covering start_time..end_time.
+    Without slot_minutes the whole window is one slot; a trailing partial
+    slot is dropped.
+    """
+    start = datetime.combine(date.min, time.fromisoformat(start_time))
+    end = datetime.combine(date.min, time.fromisoformat(end_time))
+    if not slot_minutes:
+        return [f"{start:%H:%M} - {end:%H:%M}"]
+
+    step = timedelta(minutes=slot_minutes)
+    labels = []
+    while start + step <= end:
+        labels.append(f"{start:%H:%M} - {start + step:%H:%M}")
+        start += step
+    return labels
+
+
+def load_weeks(doctor_ids):
+    """{doctor_id: {weekday: (label, ...)}} straight from the database, in one query."""
+    weeks = {doctor_id: {} for doctor_id in doctor_ids}
+    templates = db.session.execute(
+        db.select(ScheduleTemplate)
+        .where(ScheduleTemplate.doctor_id.in_(weeks))
+        .order_by(ScheduleTemplate.start_time)
+    ).scalars()
+    for t in templates:
+        day = weeks[t.doctor_id].setdefault(t.weekday, ())
+        weeks[t.doctor_id][t.weekday] = day + tuple(template_labels(t.start_time, t.end_time, t.slot_minutes))
+    return weeks
+
+
+def weekly_schedule(doctor_id, version=None):
+    """
+    One doctor's {weekday: (label, ...)}, cached per process against the
+    doctor's availability_version, which every template edit bumps. Pass
+    the version when the caller has already read it.
+    """
+    if version is None:
+        version = db.session.execute(
+            db.select(Doctor.availability_version).where(Doctor.id == doctor_id)
+        ).scalar()
+
+    with _weeks_lock:
+        cached = _weeks.get(doctor_id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    week = load_weeks([doctor_id])[doctor_id]
+    with _weeks_lock:
+        if len(_weeks) >= CACHE_SIZE:
+            _weeks.clear()
+        _weeks[doctor_id] = (version, week)
+    return week
+
+
+def is_offered(week, date_str, slot_label):
+    """Whether the weekly schedule opens `slot_label` on `date_str`."""
+    try:
+        day = date.fromisoformat(date_str)
+    except (TypeError, ValueError):
+        return False
+    return slot_label in week.get(day.weekday(), ())
+
+
+def overlapping_template(doctor_id, weekdays, start_time, end_time):
+    """An existing template of this doctor that shares time with the new window, if any."""
+    return ScheduleTemplate.query.filter(
+        ScheduleTemplate.doctor_id == doctor_id,
+        ScheduleTemplate.weekday.in_(weekdays),
+        ScheduleTemplate.start_time < end_time,
+        ScheduleTemplate.end_time > start_time
+    ).first()
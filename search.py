@@ -0,0 +1,167 @@
+import re
+from collections import namedtuple
+from markupsafe import Markup, escape
+from sqlalchemy import column, event, func, literal_column, table, text, tuple_, union_all
+from sqlalchemy.orm import aliased
+from models import db, User, Doctor, Patient, Appointment, Treatment, ArchivedAppointment, ArchivedTreatment
+
+SEARCH_COLUMNS = ('diagnosis', 'prescription', 'tests_done', 'notes', 'visit_type')
+HIT_START = '\x02'
+HIT_END = '\x03'
+
+# Hot and archived treatments are indexed separately and searched together.
+SOURCES = (
+    (Treatment, Appointment),
+    (ArchivedTreatment, ArchivedAppointment),
+)
+
+_columns = ', '.join(SEARCH_COLUMNS)
+_new = ', '.join(f'new.{c}' for c in SEARCH_COLUMNS)
+_old = ', '.join(f'old.{c}' for c in SEARCH_COLUMNS)
+_document = " || ' ' || ".join(f"coalesce({c}, '')" for c in SEARCH_COLUMNS)
+
+
+def _sqlite_ddl(name):
+    fts = f'{name}_fts'
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{_columns}, content='{name}', content_rowid='id', tokenize='porter unicode61')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {fts}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {name} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {_columns}) VALUES ('delete', old.id, {_old}); "
+        f"INSERT INTO {fts}(rowid, {_columns}) VALUES (new.id, {_new}); END",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+    ]
+
+
+def _postgres_ddl(name):
+    return [
+        f"CREATE INDEX IF NOT EXISTS ix_{name}_search ON {name} "
+        f"USING gin (to_tsvector('english', {_document}))",
+    ]
+
+
+SearchHit = namedtuple(
+    'SearchHit',
+    'treatment_id appointment_id date doctor_name patient_id patient_name snippet rank'
+)
+
+
+def create_search_index(connection, name='treatments'):
+    """
+    Create the full-text index over a treatments table. On SQLite this is
+    an FTS5 table kept in sync by triggers, so every write path
+    (update_history, bulk deletes, cascades, archiving) updates it; on
+    PostgreSQL an expression GIN index needs no syncing at all.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = _sqlite_ddl(name)
+    elif dialect == 'postgresql':
+        statements = _postgres_ddl(name)
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@event.listens_for(Treatment.__table__, 'after_create')
+@event.listens_for(ArchivedTreatment.__table__, 'after_create')
+def _treatments_created(target, connection, **kw):
+    create_search_index(connection, target.name)
+
+
+def match_terms(q):
+    return re.findall(r'\w+', q or '')
+
+
+def _search_columns(dialect, terms, name):
+    """Return (where clause, rank, snippet) for the dialect; lower rank is better."""
+    if dialect == 'postgresql':
+        document = func.to_tsvector('english', literal_column(_document))
+        query = func.plainto_tsquery('english', ' '.join(terms))
+        snippet = func.ts_headline(
+            'english', literal_column(_document), query,
+            f'StartSel={HIT_START}, StopSel={HIT_END}, MaxWords=25, MinWords=10'
+        )
+        return document.op('@@')(query), -func.ts_rank(document, query), snippet
+
+    fts = literal_column(f'{name}_fts')
+    match = ' '.join('"{}"*'.format(t.replace('"', '""')) for t in terms)
+    snippet = func.snippet(fts, -1, HIT_START, HIT_END, '…', 16)
+    return fts.op('MATCH')(match), func.bm25(fts), snippet
+
+
+def _source_select(dialect, terms, treatment, appointment, doctor_id, patient_id):
+    name = treatment.__tablename__
+    where, rank, snippet = _search_columns(dialect, terms, name)
+    doctor_user = aliased(User)
+    patient_user = aliased(User)
+
+    stmt = (
+        db.select(
+            treatment.id.label('treatment_id'),
+            appointment.id.label('appointment_id'),
+            appointment.date.label('date'),
+            doctor_user.name.label('doctor_name'),
+            Patient.id.label('patient_id'),
+            patient_user.name.label('patient_name'),
+            snippet.label('snippet'),
+            rank.label('rank'),
+        )
+        .join(appointment, treatment.appointment_id == appointment.id)
+        .join(Doctor, appointment.doctor_id == Doctor.id)
+        .join(doctor_user, Doctor.user_id == doctor_user.id)
+        .join(Patient, appointment.patient_id == Patient.id)
+        .join(patient_user, Patient.user_id == patient_user.id)
+        .where(where)
+    )
+    if dialect == 'sqlite':
+        fts = table(f'{name}_fts', column('rowid'))
+        stmt = stmt.join(fts, fts.c.rowid == treatment.id)
+    if doctor_id is not None:
+        stmt = stmt.where(appointment.doctor_id == doctor_id)
+    if patient_id is not None:
+        stmt = stmt.where(appointment.patient_id == patient_id)
+    return stmt
+
+
+def search_treatments(q, doctor_id=None, patient_id=None, after=None, per_page=20):
+    """
+    Ranked full-text search over treatment notes. Pass doctor_id to limit
+    hits to that doctor's own appointments, patient_id to one patient's
+    records. `after` is the decoded (rank, treatment_id) of the last hit on
+    the previous page. Returns (hits, next_after).
+    """
+    terms = match_terms(q)
+    if not terms:
+        return [], None
+
+    dialect = db.session.get_bind().dialect.name
+    selects = [
+        _source_select(dialect, terms, treatment, appointment, doctor_id, patient_id)
+        for treatment, appointment in SOURCES
+    ]
+
+    ranked = union_all(*selects).subquery()
+    page = db.select(ranked)
+    if after is not None:
+        page = page.where(tuple_(ranked.c.rank, ranked.c.treatment_id) > tuple_(*after))
+    rows = db.session.execute(
+        page.order_by(ranked.c.rank, ranked.c.treatment_id).limit(per_page + 1)
+    ).all()
+
+    next_after = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_after = (rows[-1].rank, rows[-1].treatment_id)
+    return [SearchHit(**row._mapping) for row in rows], next_after
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the hit markers into <mark> tags."""
+    escaped = str(escape(snippet or ''))
+    return Markup(escaped.replace(HIT_START, '<mark>').replace(HIT_END, '</mark>'))
@@ -0,0 +1,258 @@
+from sqlalchemy import and_, func, inspect, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Doctor, Patient, Appointment, ArchivedAppointment, DashboardStat, DoctorPatientCount
+
+stats_table = DashboardStat.__table__
+pairs_table = DoctorPatientCount.__table__
+
+HOSPITAL = ('hospital', 0)
+ABSENT = object()
+
+
+def _key(scope, scope_id):
+    return (stats_table.c.scope == scope) & (stats_table.c.scope_id == scope_id)
+
+
+def _insert(connection, table):
+    # engine.init_engine only accepts SQLite and PostgreSQL.
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def bump(connection, scope, scope_id, **deltas):
+    """
+    Add `deltas` to the counters of one dashboard_stats row, creating the
+    row if it does not exist yet, in a single upsert so two first writers
+    cannot both insert it. Runs on the flushing connection, so the change
+    commits or rolls back together with the write that caused it.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if not deltas:
+        return
+
+    connection.execute(
+        _insert(connection, stats_table)
+        .values(scope=scope, scope_id=scope_id, **deltas)
+        .on_conflict_do_update(
+            index_elements=['scope', 'scope_id'],
+            set_={k: stats_table.c[k] + v for k, v in deltas.items()}
+        )
+    )
+
+
+def _bump_pair(connection, doctor_id, patient_id, delta):
+    pair = (pairs_table.c.doctor_id == doctor_id) & (pairs_table.c.patient_id == patient_id)
+
+    if delta > 0:
+        # Rows at zero are deleted, so a count equal to delta means the pair is new.
+        count = connection.execute(
+            _insert(connection, pairs_table)
+            .values(doctor_id=doctor_id, patient_id=patient_id, appointments=delta)
+            .on_conflict_do_update(
+                index_elements=['doctor_id', 'patient_id'],
+                set_={'appointments': pairs_table.c.appointments + delta}
+            )
+            .returning(pairs_table.c.appointments)
+        ).scalar()
+        if count == delta:
+            bump(connection, 'doctor', doctor_id, patients=1)
+        return
+
+    result = connection.execute(
+        pairs_table.update().where(pair).values(appointments=pairs_table.c.appointments + delta)
+    )
+    if result.rowcount == 0:
+        return
+
+    remaining = connection.execute(db.select(pairs_table.c.appointments).where(pair)).scalar()
+    if remaining <= 0:
+        connection.execute(pairs_table.delete().where(pair))
+        bump(connection, 'doctor', doctor_id, patients=-1)
+
+
+def _counts(status):
+    if status is ABSENT:
+        return 0, 0
+    status = status or 'Booked'
+    return (0 if status == 'Cancelled' else 1), (1 if status == 'Completed' else 0)
+
+
+def _apply_appointment(connection, appointment, old_status, new_status):
+    old_active, old_completed = _counts(old_status)
+    new_active, new_completed = _counts(new_status)
+
+    active = new_active - old_active
+    completed = new_completed - old_completed
+    if not active and not completed:
+        return
+
+    bump(connection, *HOSPITAL, appointments=active, completed=completed)
+    bump(connection, 'doctor', appointment.doctor_id, appointments=active, completed=completed)
+    if active:
+        _bump_pair(connection, appointment.doctor_id, appointment.patient_id, active)
+
+
+@db.event.listens_for(Appointment, 'after_insert')
+def _appointment_inserted(mapper, connection, target):
+    _apply_appointment(connection, target, ABSENT, target.status)
+
+
+@db.event.listens_for(Appointment, 'after_update')
+def _appointment_updated(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if not history.has_changes():
+        return
+    old_status = history.deleted[0] if history.deleted else None
+    _apply_appointment(connection, target, old_status, target.status)
+
+
+@db.event.listens_for(Appointment, 'after_delete')
+def _appointment_deleted(mapper, connection, target):
+    _apply_appointment(connection, target, target.status, ABSENT)
+
+
+@db.event.listens_for(Doctor, 'after_insert')
+def _doctor_inserted(mapper, connection, target):
+    bump(connection, *HOSPITAL, doctors=1)
+
+
+@db.event.listens_for(Doctor, 'after_delete')
+def _doctor_deleted(mapper, connection, target):
+    row = connection.execute(
+        db.select(stats_table.c.appointments, stats_table.c.completed).where(_key('doctor', target.id))
+    ).first()
+    bump(
+        connection, *HOSPITAL,
+        doctors=-1,
+        appointments=-row.appointments if row else 0,
+        completed=-row.completed if row else 0
+    )
+    connection.execute(stats_table.delete().where(_key('doctor', target.id)))
+    connection.execute(pairs_table.delete().where(pairs_table.c.doctor_id == target.id))
+
+
+@db.event.listens_for(Patient, 'after_insert')
+def _patient_inserted(mapper, connection, target):
+    bump(connection, *HOSPITAL, patients=1)
+
+
+@db.event.listens_for(Patient, 'after_delete')
+def _patient_deleted(mapper, connection, target):
+    bump(connection, *HOSPITAL, patients=-1)
+
+
+def discard_appointments(connection, condition, appointments=Appointment.__table__):
+    """
+    Take the appointments matching `condition` out of every counter, for
+    callers about to bulk delete them with Core statements that skip the
+    mapper events. Each counter is adjusted with one set-based statement,
+    however many appointments match. Pass the archive table as
+    `appointments` to discard archived rows.
+    """
+    active = and_(condition, appointments.c.status != 'Cancelled')
+    completed = func.coalesce(func.sum(db.case((appointments.c.status == 'Completed', 1), else_=0)), 0)
+
+    total, done = connection.execute(db.select(func.count(), completed).where(active)).one()
+    if not total:
+        return
+    bump(connection, *HOSPITAL, appointments=-total, completed=-done)
+
+    for_doctor = appointments.c.doctor_id == stats_table.c.scope_id
+    connection.execute(
+        stats_table.update()
+        .where(stats_table.c.scope == 'doctor', stats_table.c.scope_id.in_(db.select(appointments.c.doctor_id).where(active)))
+        .values(
+            appointments=stats_table.c.appointments - db.select(func.count()).where(active, for_doctor).scalar_subquery(),
+            completed=stats_table.c.completed - db.select(completed).where(active, for_doctor).scalar_subquery()
+        )
+    )
+
+    for_pair = (appointments.c.doctor_id == pairs_table.c.doctor_id) & (appointments.c.patient_id == pairs_table.c.patient_id)
+    connection.execute(
+        pairs_table.update()
+        .where(db.exists().where(active, for_pair))
+        .values(appointments=pairs_table.c.appointments - db.select(func.count()).where(active, for_pair).scalar_subquery())
+    )
+
+    emptied = pairs_table.c.appointments <= 0
+    connection.execute(
+        stats_table.update()
+        .where(stats_table.c.scope == 'doctor', stats_table.c.scope_id.in_(db.select(pairs_table.c.doctor_id).where(emptied)))
+        .values(patients=stats_table.c.patients - db.select(func.count()).where(
+            emptied, pairs_table.c.doctor_id == stats_table.c.scope_id
+        ).scalar_subquery())
+    )
+    connection.execute(pairs_table.delete().where(emptied))
+
+
+def _read(scope, scope_id):
+    stat = db.session.get(DashboardStat, (scope, scope_id))
+    return stat or DashboardStat(scope=scope, scope_id=scope_id, doctors=0, patients=0, appointments=0, completed=0)
+
+
+def hospital_stats():
+    return _read(*HOSPITAL)
+
+
+def doctor_stats(doctor_id):
+    return _read('doctor', doctor_id)
+
+
+def _all_appointments(connection):
+    """Live and archived appointments as one selectable; counters are all-time totals."""
+    tables = [Appointment.__table__]
+    # Migrations older than the archive tables rebuild stats before they exist.
+    if inspect(connection).has_table(ArchivedAppointment.__tablename__):
+        tables.append(ArchivedAppointment.__table__)
+    return union_all(*[
+        db.select(t.c.doctor_id, t.c.patient_id, t.c.status) for t in tables
+    ]).subquery('all_appointments')
+
+
+def rebuild_stats(connection):
+    """Recompute every counter from the source tables."""
+    appointments = _all_appointments(connection)
+    active = appointments.c.status != 'Cancelled'
+    completed = func.sum(db.case((appointments.c.status == 'Completed', 1), else_=0))
+
+    connection.execute(pairs_table.delete())
+    connection.execute(stats_table.delete())
+
+    totals = connection.execute(
+        db.select(func.count(), func.coalesce(completed, 0)).where(active)
+    ).one()
+    connection.execute(stats_table.insert().values(
+        scope=HOSPITAL[0],
+        scope_id=HOSPITAL[1],
+        doctors=connection.execute(db.select(func.count()).select_from(Doctor.__table__)).scalar(),
+        patients=connection.execute(db.select(func.count()).select_from(Patient.__table__)).scalar(),
+        appointments=totals[0],
+        completed=totals[1]
+    ))
+
+    connection.execute(pairs_table.insert().from_select(
+        ['doctor_id', 'patient_id', 'appointments'],
+        db.select(appointments.c.doctor_id, appointments.c.patient_id, func.count())
+        .where(active)
+        .group_by(appointments.c.doctor_id, appointments.c.patient_id)
+    ))
+
+    doctors = Doctor.__table__
+    per_doctor = connection.execute(
+        db.select(
+            doctors.c.id,
+            db.select(func.count()).where(active, appointments.c.doctor_id == doctors.c.id).scalar_subquery(),
+            db.select(func.coalesce(completed, 0)).where(active, appointments.c.doctor_id == doctors.c.id).scalar_subquery(),
+            db.select(func.count()).where(pairs_table.c.doctor_id == doctors.c.id).scalar_subquery(),
+        )
+    ).all()
+    if per_doctor:
+        connection.execute(stats_table.insert(), [
+            {
+                'scope': 'doctor', 'scope_id': doctor_id,
+                'doctors': 0, 'patients': patients,
+                'appointments': total, 'completed': done,
+            }
+            for doctor_id, total, done, patients in per_doctor
+        ])
@@ -0,0 +1,42 @@
+import threading
+from datetime import datetime
+from models import db, Availability
+from availability import bump_availability_version
+
+
+def sweep_expired_slots(now=None):
+    now = now or datetime.now()
+    bump_availability_version(
+        db.select(Availability.doctor_id).where(Availability.end_at <= now).distinct()
+    )
+    removed = Availability.query.filter(Availability.end_at <= now).delete(synchronize_session=False)
+    db.session.commit()
+    return removed
+
+
+def start_sweeper(app):
+    """
+    Run sweep_expired_slots every SLOT_SWEEP_INTERVAL seconds in a daemon
+    thread. An interval of 0 disables the thread; use `flask sweep-slots`
+    from cron instead. Returns the stop event, or None when disabled.
+    """
+    interval = app.config.get('SLOT_SWEEP_INTERVAL', 0)
+    if not interval:
+        return None
+
+    stop = threading.Event()
+
+    def run():
+        while not stop.is_set():
+            with app.app_context():
+                try:
+                    removed = sweep_expired_slots()
+                    if removed:
+                        app.logger.info("Swept %d expired availability slot(s)", removed)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Availability sweep failed")
+            stop.wait(interval)
+
+    threading.Thread(target=run, name='slot-sweeper', daemon=True).start()
+    return stop
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import pytest
+from werkzeug.security import generate_password_hash
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='hms-tests-'), 'hospital.db')
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from migrations import upgrade_database
+    app.config['TESTING'] = True
+    with app.app_context():
+        upgrade_database()
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """An app context over an emptied database and empty process caches."""
+    from models import db
+    from directory import invalidate_directory
+    from user_cache import user_cache
+    import schedule
+    with app.app_context():
+        with db.engine.begin() as conn:
+            for table in reversed(db.metadata.sorted_tables):
+                if table.name != 'schema_migrations':
+                    conn.execute(table.delete())
+        # Ids are reused once the tables are emptied, so cached entries would be stale.
+        user_cache.clear()
+        schedule._weeks.clear()
+        invalidate_directory()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def people(db):
+    """One doctor and one patient; returns (doctor, patient)."""
+    from models import User, Doctor, Patient
+    password = generate_password_hash('x')
+    doctor_user = User(name='Doc', email='doc@test', password=password, role='doctor')
+    patient_user = User(name='Pat', email='pat@test', password=password, role='patient')
+    db.session.add_all([doctor_user, patient_user])
+    db.session.flush()
+    doctor = Doctor(user_id=doctor_user.id, specialization='Cardiology')
+    patient = Patient(user_id=patient_user.id)
+    db.session.add_all([doctor, patient])
+    db.session.commit()
+    return doctor, patient
+
+
+@pytest.fixture
+def admin(db):
+    """An admin account; its password is 'x' like the people fixture's."""
+    from models import User
+    user = User(name='Admin', email='admin@test', password=generate_password_hash('x'), role='admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def login(app):
+    """login(email) returns a test client signed in as that account."""
+    def login(email):
+        client = app.test_client()
+        response = client.post('/login', data={'email': email, 'password': 'x'})
+        assert response.status_code == 302, response.get_data(as_text=True)
+        return client
+    return login
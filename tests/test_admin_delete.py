@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+from models import Appointment, Availability, Doctor, ScheduleTemplate
+
+
+def test_deleting_a_patient_reopens_their_booked_slots(db, people, admin, login):
+    doctor, patient = people
+    day = date.today() + timedelta(days=7)
+    db.session.add(ScheduleTemplate(doctor_id=doctor.id, weekday=day.weekday(),
+                                    start_time='08:00', end_time='09:00'))
+    for time_slot in ('08:00 - 09:00', '14:00 - 15:00'):
+        db.session.add(Availability(doctor_id=doctor.id, date=day.isoformat(),
+                                    time_slot=time_slot, status='Booked'))
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                                   date=day.isoformat(), time=time_slot, status='Booked'))
+    db.session.commit()
+    version = doctor.availability_version
+
+    client = login(admin.email)
+    assert client.get(f'/admin/delete_patient/{patient.id}').status_code == 302
+
+    db.session.expire_all()
+    # The schedule slot needs no row once free; the stored slot is open again.
+    assert [(a.time_slot, a.status) for a in Availability.query.all()] == [('14:00 - 15:00', 'Available')]
+    assert db.session.get(Doctor, doctor.id).availability_version > version
@@ -0,0 +1,25 @@
+from werkzeug.datastructures import MultiDict
+from models import Appointment
+from routes.admin_routes import appointment_page, _appointment_filters
+
+
+def test_appointment_pages_follow_start_time(app, db, people):
+    doctor, patient = people
+    # Inserted latest first, so id order disagrees with start order.
+    for day, time in (('2030-01-02', '08:00 - 09:00'), ('2030-01-01', '14:00 - 15:00'),
+                      ('2030-01-01', '09:00 - 10:00')):
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, date=day,
+                                   time=time, status='Booked'))
+    db.session.commit()
+
+    app.config['ADMIN_PAGE_SIZE'] = 2
+    try:
+        filters = _appointment_filters(MultiDict({'appt_from': '2030-01-01', 'appt_to': '2030-01-02'}))
+        first, after = appointment_page(filters)
+        rest, end = appointment_page(filters, after)
+    finally:
+        app.config.pop('ADMIN_PAGE_SIZE')
+
+    starts = [a.start_at.strftime('%Y-%m-%d %H:%M') for a in first + rest]
+    assert starts == ['2030-01-01 09:00', '2030-01-01 14:00', '2030-01-02 08:00']
+    assert end is None
@@ -0,0 +1,25 @@
+from datetime import datetime
+from archive import archive_old_rows
+from models import Appointment, Treatment, ArchivedAppointment, ArchivedTreatment
+
+
+def test_archives_the_newest_appointment_and_never_reuses_its_id(db, people):
+    doctor, patient = people
+    for day in ('2020-01-01', '2020-01-02'):
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, date=day,
+                                   time='08:00 - 12:00', status='Completed'))
+    db.session.commit()
+    newest = db.session.execute(db.select(db.func.max(Appointment.id))).scalar()
+    db.session.add(Treatment(appointment_id=newest, diagnosis='migraine'))
+    db.session.commit()
+
+    assert archive_old_rows(cutoff=datetime(2021, 1, 1), batch_size=1) == 2
+    assert Appointment.query.count() == 0
+    assert ArchivedAppointment.query.count() == 2
+    assert ArchivedTreatment.query.one().appointment_id == newest
+
+    booked = Appointment(patient_id=patient.id, doctor_id=doctor.id, date='2030-01-01',
+                         time='08:00 - 12:00', status='Booked')
+    db.session.add(booked)
+    db.session.commit()
+    assert booked.id > newest
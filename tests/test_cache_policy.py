@@ -0,0 +1,11 @@
+from cache_policy import NO_STORE
+
+
+def test_dashboards_and_logout_are_not_stored(admin, people, login):
+    client = login(admin.email)
+    responses = [client.get('/admin/dashboard'), client.get('/admin/dashboard/doctors')]
+    client = login('doc@test')
+    responses += [client.get('/doctor/dashboard'), client.get('/logout')]
+    for response in responses:
+        assert response.headers['Cache-Control'] == NO_STORE
+        assert response.headers['Pragma'] == 'no-cache'
@@ -0,0 +1,26 @@
+from datetime import date, timedelta
+from models import Appointment, Availability
+
+
+def test_cancelling_twice_leaves_a_rebooked_slot_alone(db, people, login):
+    doctor, patient = people
+    day = (date.today() + timedelta(days=7)).isoformat()
+    slot = Availability(doctor_id=doctor.id, date=day, time_slot='08:00 - 12:00', status='Booked')
+    appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, date=day,
+                              time='08:00 - 12:00', status='Booked')
+    db.session.add_all([slot, appointment])
+    db.session.commit()
+
+    client = login('pat@test')
+    client.get(f'/patient/cancel_appointment/{appointment.id}')
+    db.session.refresh(slot)
+    assert slot.status == 'Available'
+
+    # Someone else books the reopened slot, then the first patient cancels again.
+    slot.status = 'Booked'
+    db.session.commit()
+    client.get(f'/patient/cancel_appointment/{appointment.id}')
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1] == ('info', 'This appointment is already cancelled.')
+    db.session.refresh(slot)
+    assert slot.status == 'Booked'
@@ -0,0 +1,16 @@
+from datetime import date, timedelta
+from models import Availability
+
+
+def test_adding_an_existing_slot_is_refused(db, people, login):
+    doctor, _ = people
+    client = login('doc@test')
+    form = {'date': (date.today() + timedelta(days=3)).isoformat(),
+            'time_slot': '08:00 - 12:00', 'status': 'Available'}
+
+    for _ in range(2):
+        assert client.post('/doctor/availability', data=form).status_code == 302
+
+    with client.session_transaction() as session:
+        assert session['_flashes'][-1] == ('error', 'That slot already exists.')
+    assert Availability.query.filter_by(doctor_id=doctor.id).count() == 1
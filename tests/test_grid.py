@@ -0,0 +1,19 @@
+from datetime import date, datetime, time, timedelta
+from availability import build_grid, grid_etag
+from models import Availability
+
+
+def test_etag_changes_when_a_custom_slot_ends(db, people):
+    doctor, _ = people
+    day = date.today() + timedelta(days=3)
+    db.session.add(Availability(doctor_id=doctor.id, date=day.isoformat(),
+                                time_slot='06:00 - 06:10', status='Available'))
+    db.session.commit()
+    version = doctor.availability_version
+
+    before = datetime.combine(day, time(6, 5))
+    after = before + timedelta(minutes=10)
+    expired = [build_grid(doctor.id, day, 1, now, version)[3][day.isoformat()]['06:00 - 06:10']
+               for now in (before, after)]
+    assert expired == [False, True]
+    assert grid_etag(doctor.id, version, day, 1, before) != grid_etag(doctor.id, version, day, 1, after)
@@ -0,0 +1,28 @@
+import logging
+import pytest
+from models import User
+
+
+@pytest.fixture
+def slow_queries(app, caplog):
+    saved = {key: app.config[key] for key in ('SLOW_QUERY_MS', 'SLOW_QUERY_LOG_PARAMS')}
+    app.config['SLOW_QUERY_MS'] = 1e-9
+    caplog.set_level(logging.WARNING)
+    yield app.config
+    app.config.update(saved)
+
+
+def _logged_lookup(db, caplog):
+    caplog.clear()
+    db.session.execute(db.select(User.id).where(User.email == 'secret@example.com')).all()
+    return '\n'.join(r.getMessage() for r in caplog.records if r.name.endswith('slow_queries'))
+
+
+def test_slow_query_parameters_are_redacted_by_default(db, slow_queries, caplog):
+    slow_queries['SLOW_QUERY_LOG_PARAMS'] = False
+    logged = _logged_lookup(db, caplog)
+    assert 'Slow query' in logged
+    assert 'secret@example.com' not in logged
+
+    slow_queries['SLOW_QUERY_LOG_PARAMS'] = True
+    assert 'secret@example.com' in _logged_lookup(db, caplog)
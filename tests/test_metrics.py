@@ -0,0 +1,25 @@
+import pytest
+
+REMOTE = {'REMOTE_ADDR': '203.0.113.7'}
+
+
+@pytest.fixture
+def metrics_config(app):
+    saved = {key: app.config[key] for key in ('METRICS_TOKEN', 'METRICS_PUBLIC')}
+    yield app.config
+    app.config.update(saved)
+
+
+def test_metrics_are_closed_to_remote_clients_by_default(app, metrics_config):
+    metrics_config.update(METRICS_TOKEN=None, METRICS_PUBLIC=False)
+    client = app.test_client()
+    assert client.get('/metrics', environ_base=REMOTE).status_code == 403
+    assert client.get('/metrics').status_code == 200
+
+    metrics_config['METRICS_TOKEN'] = 's3cret'
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', environ_base=REMOTE,
+                      headers={'Authorization': 'Bearer s3cret'}).status_code == 200
+
+    metrics_config.update(METRICS_TOKEN=None, METRICS_PUBLIC=True)
+    assert client.get('/metrics', environ_base=REMOTE).status_code == 200
@@ -0,0 +1,92 @@
+"""
+Budgeted routes against a small hospital. Under TESTING a route that runs
+more statements than its QUERY_BUDGET raises QueryBudgetExceeded, so an
+N+1 regression fails here instead of reaching production.
+"""
+from datetime import date, datetime, timedelta
+import pytest
+from werkzeug.security import generate_password_hash
+from archive import archive_old_rows
+from instrumentation import QueryBudgetExceeded
+from models import User, Doctor, Patient, Department, Appointment, Availability, Treatment
+
+
+@pytest.fixture
+def hospital(db, admin):
+    """Three doctors and three patients with past, cancelled, upcoming and archived visits."""
+    password = generate_password_hash('x')
+    department = Department(name='Cardiology', description='')
+    db.session.add(department)
+    db.session.flush()
+
+    doctors, patients = [], []
+    for i in range(3):
+        doctor_user = User(name=f'Doc{i}', email=f'doc{i}@test', password=password, role='doctor')
+        patient_user = User(name=f'Pat{i}', email=f'pat{i}@test', password=password, role='patient')
+        db.session.add_all([doctor_user, patient_user])
+        db.session.flush()
+        doctors.append(Doctor(user_id=doctor_user.id, specialization='Cardiology', department_id=department.id))
+        patients.append(Patient(user_id=patient_user.id))
+    db.session.add_all(doctors + patients)
+    db.session.flush()
+
+    upcoming = (date.today() + timedelta(days=2)).isoformat()
+    for d, doctor in enumerate(doctors):
+        for p, patient in enumerate(patients):
+            visits = [('2020-01-0%d' % (p + 1), 'Completed'), ('2024-02-0%d' % (p + 1), 'Completed'),
+                      ('2024-03-0%d' % (p + 1), 'Cancelled')]
+            for day, status in visits:
+                appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id, date=day,
+                                          time='08:00 - 12:00', status=status)
+                db.session.add(appointment)
+                if status == 'Completed':
+                    db.session.flush()
+                    db.session.add(Treatment(appointment_id=appointment.id, diagnosis='flu', prescription='rest'))
+        slot = ['08:00 - 12:00', '16:00 - 21:00'][d % 2]
+        db.session.add(Availability(doctor_id=doctor.id, date=upcoming, time_slot=slot, status='Booked'))
+        db.session.add(Appointment(patient_id=patients[d].id, doctor_id=doctor.id, date=upcoming,
+                                   time=slot, status='Booked'))
+    db.session.commit()
+    archive_old_rows(cutoff=datetime(2021, 1, 1))
+    return doctors, patients
+
+
+def _get(client, url):
+    response = client.get(url)
+    assert response.status_code == 200, url
+    return int(response.headers['X-Query-Count'])
+
+
+def test_admin_routes_stay_within_budget(hospital, admin, login):
+    _, patients = hospital
+    client = login(admin.email)
+    for url in ('/admin/dashboard', '/admin/dashboard/appointments',
+                f'/admin/patient_history/{patients[0].id}', f'/admin/patient_history/{patients[0].id}/rows'):
+        _get(client, url)
+
+
+def test_doctor_routes_stay_within_budget(hospital, login):
+    _, patients = hospital
+    client = login('doc0@test')
+    for url in ('/doctor/dashboard', f'/doctor/patient_history/{patients[0].id}',
+                f'/doctor/patient_history/{patients[0].id}/rows'):
+        _get(client, url)
+
+
+def test_patient_routes_stay_within_budget(hospital, login):
+    client = login('pat0@test')
+    for url in ('/patient/dashboard', '/patient/appointments'):
+        _get(client, url)
+    # Each request is counted on its own, not on top of the previous one.
+    assert _get(client, '/patient/appointments') == _get(client, '/patient/appointments')
+
+
+def test_an_overrun_fails_under_testing(app, hospital, login):
+    client = login('pat0@test')
+    budget = app.config['QUERY_BUDGET']
+    app.config['QUERY_BUDGET'] = 1
+    try:
+        with pytest.raises(QueryBudgetExceeded):
+            client.get('/patient/dashboard')
+    finally:
+        app.config['QUERY_BUDGET'] = budget
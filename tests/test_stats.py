@@ -0,0 +1,25 @@
+from models import Appointment
+from stats import bump, doctor_stats
+
+
+def test_bump_creates_then_adds_to_a_counter_row(db):
+    with db.engine.begin() as conn:
+        bump(conn, 'doctor', 42, appointments=1)
+        bump(conn, 'doctor', 42, appointments=2, completed=1)
+    stats = doctor_stats(42)
+    assert (stats.appointments, stats.completed) == (3, 1)
+
+
+def test_a_doctors_patient_count_follows_their_appointments(db, people):
+    doctor, patient = people
+    for day in ('2030-01-01', '2030-01-02'):
+        db.session.add(Appointment(patient_id=patient.id, doctor_id=doctor.id, date=day,
+                                   time='08:00 - 12:00', status='Booked'))
+    db.session.commit()
+    assert (doctor_stats(doctor.id).patients, doctor_stats(doctor.id).appointments) == (1, 2)
+
+    for appointment in Appointment.query.all():
+        appointment.status = 'Cancelled'
+    db.session.commit()
+    db.session.expire_all()
+    assert (doctor_stats(doctor.id).patients, doctor_stats(doctor.id).appointments) == (0, 0)
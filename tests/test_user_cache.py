@@ -0,0 +1,60 @@
+import pytest
+from sqlalchemy import event
+import user_cache
+from models import User
+from user_cache import load_session_user
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(user_cache, 'time', clock)
+    return clock
+
+
+def test_a_fresh_entry_is_served_without_a_query(db, people):
+    doctor, _ = people
+    assert load_session_user(doctor.user_id).role == 'doctor'
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        assert load_session_user(doctor.user_id).role == 'doctor'
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    assert statements == []
+
+
+def test_deactivation_elsewhere_cuts_off_a_cached_user_after_the_ttl(app, db, people, clock):
+    doctor, _ = people
+    user_id = doctor.user_id
+    assert load_session_user(user_id).role == 'doctor'
+
+    # Another worker deactivates the account; this process's cache is never told.
+    db.session.get(User, user_id).active = False
+    db.session.commit()
+    assert load_session_user(user_id) is not None
+
+    clock.now += app.config['USER_CACHE_TTL']
+    assert load_session_user(user_id) is None
+
+
+def test_deleted_user_is_not_served_from_cache(app, db, people, clock):
+    doctor, _ = people
+    user_id = doctor.user_id
+    assert load_session_user(user_id) is not None
+
+    db.session.execute(db.delete(User).where(User.id == user_id))
+    db.session.commit()
+
+    clock.now += app.config['USER_CACHE_TTL']
+    assert load_session_user(user_id) is None
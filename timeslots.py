@@ -0,0 +1,73 @@
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+TIME_FORMATS = ['%I:%M %p', '%H:%M', '%I %p', '%H%M', '%I:%M%p']
+
+SLOTS = [
+    { 'key': 'morning', 'label': '08:00 - 12:00', 'end_hour': 12, 'end_min': 0 },
+    { 'key': 'evening', 'label': '16:00 - 21:00', 'end_hour': 21, 'end_min': 0 }
+]
+
+
+def parse_time(value):
+    value = value.strip()
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).time()
+        except ValueError:
+            continue
+    try:
+        return datetime.strptime(value.replace(' ', ''), '%I:%M%p').time()
+    except ValueError:
+        return None
+
+
+def slot_bounds(date_str, time_slot_str):
+    """
+    Parse a date and a time slot into (start, end) datetimes.
+    Supported examples: '10:00 AM - 12:00 PM', '10:00-12:00', '10:00 - 12:00'.
+    A single time such as '10:30' gives a start with no end. Anything that
+    cannot be parsed comes back as None.
+    """
+    if not date_str or not time_slot_str:
+        return None, None
+
+    try:
+        day = datetime.strptime(date_str, '%Y-%m-%d').date()
+    except ValueError:
+        return None, None
+
+    parts = time_slot_str.split('-')
+    start_t = parse_time(parts[0])
+    end_t = parse_time(parts[-1]) if len(parts) >= 2 else None
+
+    start = datetime.combine(day, start_t) if start_t else None
+    end = datetime.combine(day, end_t) if end_t else None
+    return start, end
+
+
+def window_bounds(first_day, days):
+    start = datetime.combine(first_day, time.min)
+    return start, start + timedelta(days=days)
+
+
+def slot_end(day, slot):
+    return datetime.combine(day, time(slot['end_hour'], slot['end_min']))
+
+
+@lru_cache(maxsize=1024)
+def slot_for_label(label):
+    """
+    A SLOTS-style dict for a 'start - end' label, with the start time for
+    ordering grid rows. None when either end does not parse.
+    """
+    parts = label.split('-')
+    start_t = parse_time(parts[0])
+    end_t = parse_time(parts[-1]) if len(parts) >= 2 else None
+    if not start_t or not end_t:
+        return None
+    return {
+        'key': label, 'label': label,
+        'start_hour': start_t.hour, 'start_min': start_t.minute,
+        'end_hour': end_t.hour, 'end_min': end_t.minute,
+    }
@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy.orm import object_session
+from models import db, User
+
+
+class SessionUser(UserMixin):
+    """
+    The subset of a User that authorization needs, kept outside the ORM so
+    it can live in the loader cache. Routes that edit the account must load
+    the real User row.
+    """
+
+    def __init__(self, id, role, active, name):
+        self.id = id
+        self.role = role
+        self.active = active
+        self.name = name
+
+    @property
+    def is_active(self):
+        return self.active
+
+    def __repr__(self):
+        return f"<SessionUser {self.name} - {self.role}>"
+
+
+class UserCache:
+    """
+    Bounded LRU of SessionUser entries, each tagged with the row's
+    session_version. An entry is served without touching the database for
+    USER_CACHE_TTL seconds; after that one lookup reads the version by
+    primary key and keeps the entry only if it still matches. An account
+    change made through another worker is therefore seen within
+    USER_CACHE_TTL seconds, while invalidate() drops this worker's entry at
+    once.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        ttl = current_app.config.get('USER_CACHE_TTL', 10)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[2] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            generation = self._generation
+
+        version = db.session.execute(
+            db.select(User.session_version).where(User.id == user_id)
+        ).scalar()
+        if version is None:
+            self.invalidate(user_id)
+            return None
+
+        if entry and entry[1] == version:
+            user = entry[0]
+        else:
+            row = db.session.execute(
+                db.select(User.id, User.role, User.active, User.name, User.session_version).where(User.id == user_id)
+            ).first()
+            if row is None:
+                return None
+            user, version = SessionUser(row.id, row.role, bool(row.active), row.name), row.session_version
+
+        with self._lock:
+            # An invalidate() that ran meanwhile may have been about this very row.
+            if generation != self._generation:
+                return user
+            self._entries[user_id] = (user, version, now + ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > current_app.config.get('USER_CACHE_SIZE', 1024):
+                self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+user_cache = UserCache()
+
+
+def load_session_user(user_id):
+    user = user_cache.get(int(user_id))
+    if user is None or not user.active:
+        return None
+    return user
+
+
+def invalidate_user(user_id):
+    """
+    Drop this process's entry now; other workers notice the bumped
+    session_version once their entry's USER_CACHE_TTL runs out.
+    """
+    user_cache.invalidate(user_id)
+
+
+@db.event.listens_for(User, 'before_update')
+def _bump_session_version(mapper, connection, target):
+    # Only real column changes count, not a backref touching a collection.
+    if object_session(target).is_modified(target, include_collections=False):
+        target.session_version = (target.session_version or 0) + 1